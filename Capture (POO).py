@@ -3,6 +3,7 @@ import mediapipe as mp
 import pyautogui
 import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 # ตั้งค่า MediaPipe
 mp_hands = mp.solutions.hands
@@ -23,6 +24,18 @@ cap.set(cv2.CAP_PROP_FPS, 30)
 last_screenshot_time = 0
 delay = 2  # หน่วงเวลา 2 วินาที
 
+# บันทึกไฟล์ใน background เพื่อไม่ให้กล้องค้างระหว่าง encode PNG
+save_pool = ThreadPoolExecutor(max_workers=1)
+png_compression = 1  # 0-9
+
+def save_screenshot(screenshot, filename):
+    """บันทึก screenshot (ทำงานใน background thread)"""
+    try:
+        screenshot.save(filename, format="PNG", compress_level=png_compression)
+        print(f"Screenshot saved: {filename}")
+    except Exception as e:
+        print(f"Error saving screenshot: {e}")
+
 def is_three_fingers_up(hand_landmarks):
     """ตรวจสอบว่า 3 นิ้วแรกชี้ขึ้น (นิ้วชี้, นิ้วกลาง, นิ้วนาง)"""
     landmarks = hand_landmarks.landmark
@@ -86,11 +99,10 @@ while cap.isOpened():
                         screenshot = pyautogui.screenshot()
                         screenshot_count += 1
                         
-                        # บันทึกไฟล์
+                        # บันทึกไฟล์ (background)
                         filename = f"screenshot_{screenshot_count}_{int(time.time())}.png"
-                        screenshot.save(filename)
+                        save_pool.submit(save_screenshot, screenshot, filename)
                         
-                        print(f"Screenshot saved: {filename}")
                         last_screenshot_time = current_time
                         
                         # แสดงผลบนหน้าจอ
@@ -114,3 +126,4 @@ while cap.isOpened():
 cap.release()
 cv2.destroyAllWindows()
 hands.close()
+save_pool.shutdown(wait=True)
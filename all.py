@@ -1,348 +1,2160 @@
 import cv2
 import mediapipe as mp
-import pyautogui
+from mediapipe.framework.formats import landmark_pb2
+import numpy as np
+import argparse
+import bisect
+import csv
+import json
 import math
+import os
+import signal
+import sys
+import threading
 import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyautogui
+except Exception:  # no display (e.g. replay on a CI box): only the real actions are unavailable
+    pyautogui = None
 
 
 # Initialize MediaPipe Hands
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(
-    static_image_mode=False,
-    max_num_hands=1,
-    min_detection_confidence=0.7,
-    min_tracking_confidence=0.7,
-    model_complexity=0
-)
 mp_draw = mp.solutions.drawing_utils
 
+def create_hands(model_complexity=0, min_detection_confidence=0.7, min_tracking_confidence=0.7,
+                 max_num_hands=1):
+    """A MediaPipe Hands model (created in main(), not at import)"""
+    return mp_hands.Hands(
+        static_image_mode=False,
+        max_num_hands=max_num_hands,
+        min_detection_confidence=min_detection_confidence,
+        min_tracking_confidence=min_tracking_confidence,
+        model_complexity=model_complexity
+    )
+
 # --- Global variables ---
-prev_distance = None
-last_zoom_time = 0
-last_reset_time = 0
-last_scroll_time = 0
-last_screenshot_time = 0
-last_horizontal_scroll_time = 0
-last_gesture = None
-
-# Cooldown settings
+# Time source for the gesture timing (replay.py swaps in the recorded timestamps)
+clock = time.time
+
+# Repeat intervals while a gesture is held (seconds)
 zoom_cooldown = 1.0
 reset_cooldown = 2.0
 scroll_cooldown = 0.1
 screenshot_cooldown = 2.0
 horizontal_scroll_cooldown = 0.1 #เดิม 0.02
 
+# Gesture state machine: frames a gesture must be seen before it acts
+# (confirm), frames it may be missing before it ends (release), and seconds
+# between actions while held (repeat; None = once per hold, 0 = every frame).
+# Expensive one-shot actions wait longer, so one misread frame does nothing.
+GESTURE_TIMING = {
+    "screenshot": dict(confirm=5, release=3, repeat=lambda: screenshot_cooldown),
+    "reset_zoom": dict(confirm=5, release=3, repeat=lambda: reset_cooldown),
+    "horizontal_scroll": dict(confirm=2, release=2, repeat=lambda: horizontal_scroll_cooldown),
+    "scroll_up": dict(confirm=2, release=2, repeat=lambda: 0 if continuous_scroll else scroll_cooldown),
+    "scroll_down": dict(confirm=2, release=2, repeat=lambda: 0 if continuous_scroll else scroll_cooldown),
+    "zoom": dict(confirm=3, release=3, repeat=lambda: 0 if continuous_zoom else zoom_cooldown),
+    "spread_zoom": dict(confirm=3, release=3, repeat=0),
+}
+# Once a gesture is held, its thresholds are relaxed by this fraction (and a
+# direction only flips past threshold +- this fraction), so values hovering
+# around a threshold do not toggle it every frame
+hysteresis = 0.15
+
 # Other settings
-scroll_amount = 40
-distance_threshold = 0.05
+scroll_amount = 40   # per step when continuous_scroll is off
+
+# Distance thresholds, in normalized image units for a hand of
+# reference_hand_scale (wrist -> middle MCP at about arm's length).
+# With normalize_thresholds they grow and shrink with the hand in the frame.
+normalize_thresholds = True
+reference_hand_scale = 0.18
+distance_threshold = 0.05   # index-middle spread, horizontal scroll direction
+finger_separation = 0.03    # tip gaps for the screenshot gesture
+zoom_threshold = 0.13       # thumb-index distance, step zoom
 screenshot_count = 0
+last_screenshot_file = ""
+screenshot_lock = threading.Lock()   # the writer's pool threads update both
+
+# Screenshot defaults (--screenshot-format etc.): "png", "jpg" or "npy" (raw, fastest)
+screenshot_format = "png"
+png_compression = 1   # 0-9, higher = smaller file but slower
+jpeg_quality = 90
+
+# Camera resolution, and the width of the image given to MediaPipe
+# (the preview keeps the full camera resolution). None = no downscale.
+capture_width = 640
+capture_height = 480
+inference_width = 320
+
+# Zoom by steps proportional to how far the pinch opened/closed since the
+# gesture started, instead of one step per zoom_cooldown
+continuous_zoom = True
+zoom_step = 0.15        # pinch change per zoom step, in hand sizes
+zoom_max_steps = 4      # per frame
+zoom_settle = 0.15      # seconds after the gesture starts before the baseline is fixed
+spread_zoom_step = 0.5  # change of the distance between two open hands per step, in hand sizes
+
+# Scroll at a rate set by the index tilt (small increments at scroll_tick_hz)
+# instead of scroll_amount every scroll_cooldown
+continuous_scroll = True
+scroll_min_rate = 150   # units/s with the finger tilted 30 degrees
+scroll_max_rate = 800   # units/s with the finger straight up/down
+scroll_tick_hz = 60
+
+# Hands to track. With more than one, every hand gets its own gesture state
+# and two-hand gestures are on; ROI crops and adaptive inference (which
+# follow a single hand) are then off.
+max_hands = 1
+
+# Run inference on a crop around the hand instead of the full frame
+roi_mode = True
+
+# Smooth the landmarks (One-Euro filter) before the gesture rules;
+# each rule picks a profile from SMOOTHING_PROFILES
+smoothing = True
+
+# Run inference less often while the hand is still (landmarks are extrapolated in between)
+adaptive_inference = True
 
 # Disable fail-safe
-pyautogui.FAILSAFE = False
+if pyautogui:
+    pyautogui.FAILSAFE = False
+
+# --- Instrumentation ---
+class StageTimer:
+    """Per-stage durations from time.perf_counter_ns, kept in ring buffers.
+
+    record(stage, start) stores now - start and returns now, so stages can be
+    chained through the loop. Every sample also goes into a cumulative
+    histogram, which dump() writes to a .json or .csv file.
+    """
+
+    HISTOGRAM_MS = [0.5, 1, 2, 3, 5, 8, 12, 16, 20, 25, 33, 50, 75, 100, 200, 500]
+
+    def __init__(self, stages, size=600):
+        self.size = size
+        self.samples = {name: np.zeros(size, np.int64) for name in stages}
+        self.counts = {name: 0 for name in stages}
+        self.edges_ns = [int(ms * 1e6) for ms in self.HISTOGRAM_MS]
+        self.histograms = {name: [0] * (len(self.edges_ns) + 1) for name in stages}
+        self.frame_ends = deque(maxlen=60)
+        self.hud_lines = []
+        self.hud_time = 0
+
+    @staticmethod
+    def now():
+        return time.perf_counter_ns()
+
+    def add(self, stage, duration_ns):
+        n = self.counts[stage]
+        self.samples[stage][n % self.size] = duration_ns
+        self.counts[stage] = n + 1
+        self.histograms[stage][bisect.bisect_left(self.edges_ns, duration_ns)] += 1
+
+    def record(self, stage, start_ns):
+        end = time.perf_counter_ns()
+        self.add(stage, end - start_ns)
+        return end
+
+    def frame_done(self):
+        self.frame_ends.append(time.perf_counter_ns())
+
+    def fps(self):
+        if len(self.frame_ends) < 2:
+            return 0.0
+        return (len(self.frame_ends) - 1) * 1e9 / (self.frame_ends[-1] - self.frame_ends[0])
+
+    def percentiles(self, stage, q=(50, 95)):
+        """Percentiles in ms over the ring buffer (None if no samples yet)"""
+        n = min(self.counts[stage], self.size)
+        if n == 0:
+            return None
+        return np.percentile(self.samples[stage][:n], q) / 1e6
+
+    def hud(self, every_ns=500_000_000):
+        """FPS and p50/p95 lines for the preview, recomputed twice a second"""
+        now = time.perf_counter_ns()
+        if now - self.hud_time >= every_ns:
+            self.hud_time = now
+            lines = [f"FPS {self.fps():.1f}"]
+            for stage in self.samples:
+                p = self.percentiles(stage)
+                if p is not None:
+                    lines.append(f"{stage} {p[0]:.1f}/{p[1]:.1f}ms")
+            self.hud_lines = lines
+        return self.hud_lines
+
+    def summary(self):
+        lines = [f"FPS {self.fps():.1f} " if self.frame_ends else ""]
+        lines[0] += f"(p50/p95/p99/max ms over the last {self.size} samples)"
+        for stage in self.samples:
+            n = min(self.counts[stage], self.size)
+            if n:
+                p50, p95, p99 = self.percentiles(stage, (50, 95, 99))
+                worst = self.samples[stage][:n].max() / 1e6
+                lines.append(f"  {stage}: n={self.counts[stage]} {p50:.2f}/{p95:.2f}/{p99:.2f}/{worst:.2f}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Write per-stage percentiles and histograms to a .json or .csv file"""
+        upper = self.HISTOGRAM_MS + [None]
+        lower = [0] + self.HISTOGRAM_MS
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as fh:
+                writer = csv.writer(fh)
+                writer.writerow(["stage", "bucket_lo_ms", "bucket_hi_ms", "count"])
+                for stage, hist in self.histograms.items():
+                    for lo, hi, count in zip(lower, upper, hist):
+                        writer.writerow([stage, lo, "" if hi is None else hi, count])
+        else:
+            data = {"fps": self.fps(), "stages": {}}
+            for stage, hist in self.histograms.items():
+                p = self.percentiles(stage, (50, 95, 99))
+                data["stages"][stage] = {
+                    "count": self.counts[stage],
+                    "p50_ms": None if p is None else float(p[0]),
+                    "p95_ms": None if p is None else float(p[1]),
+                    "p99_ms": None if p is None else float(p[2]),
+                    "histogram": [{"lo_ms": lo, "hi_ms": hi, "count": count}
+                                  for lo, hi, count in zip(lower, upper, hist)],
+                }
+            with open(path, "w") as fh:
+                json.dump(data, fh, indent=2)
+        print(f"Timings saved: {path}")
+
+stage_timer = StageTimer(["capture", "preprocess", "inference", "gestures", "render", "action"])
+
+# Glass-to-action: camera frame captured -> backend call returned, per gesture
+action_latency = StageTimer(["scroll", "zoom", "horizontal", "reset", "screenshot"], size=1000)
+
+# --- Action backends ---
+# A backend injects the input: scroll(amount), press(key, presses), hotkey(*keys)
+# and screenshot() (a PIL image, or None if it cannot grab the screen).
+class PyAutoGuiBackend:
+    """Real input through pyautogui"""
+    name = "pyautogui"
+
+    def __init__(self):
+        if pyautogui is None:
+            raise RuntimeError("pyautogui is not available (no display?)")
+
+    def scroll(self, amount):
+        pyautogui.scroll(amount)
+
+    def press(self, key, presses=1):
+        pyautogui.press(key, presses=presses)
+
+    def hotkey(self, *keys):
+        pyautogui.hotkey(*keys)
+
+    def screenshot(self):
+        return pyautogui.screenshot()
+
+class RecordingBackend:
+    """Injects nothing, keeps (perf_counter_ns, action, value) for every call"""
+    name = "record"
+
+    def __init__(self):
+        self.log = []
+
+    def scroll(self, amount):
+        self.log.append((time.perf_counter_ns(), "scroll", amount))
+
+    def press(self, key, presses=1):
+        self.log.append((time.perf_counter_ns(), "press", f"{key} x{presses}"))
+
+    def hotkey(self, *keys):
+        self.log.append((time.perf_counter_ns(), "hotkey", "+".join(keys)))
+
+    def screenshot(self):
+        self.log.append((time.perf_counter_ns(), "screenshot", ""))
+        return None
+
+    def summary(self):
+        counts = {}
+        for _, kind, value in self.log:
+            counts[f"{kind} {value}"] = counts.get(f"{kind} {value}", 0) + 1
+        return ", ".join(f"{action}: {count}" for action, count in sorted(counts.items()))
+
+class XTestBackend:
+    """Linux/X11: XTest events over one persistent display connection (python-xlib).
+
+    Events are only flushed, not synced, so a call costs a socket write
+    instead of a round trip to the X server. Like pyautogui on X11,
+    scroll(n) sends n wheel clicks.
+    """
+    name = "xtest"
+    KEYSYMS = {"ctrl": "Control_L", "shift": "Shift_L", "alt": "Alt_L", "+": "plus", "-": "minus",
+               "=": "equal", "left": "Left", "right": "Right", "up": "Up", "down": "Down"}
+
+    def __init__(self):
+        try:
+            from Xlib import X, XK, display
+            from Xlib.ext import xtest
+        except ImportError:
+            raise RuntimeError("the xtest backend needs python-xlib (pip install python-xlib)")
+        try:
+            self.display = display.Display()
+        except Exception as e:
+            raise RuntimeError(f"cannot open the X display: {e}")
+        self.X = X
+        self.XK = XK
+        self.xtest = xtest
+        self.keycodes = {}
+
+    def _keycode(self, key):
+        code = self.keycodes.get(key)
+        if code is None:
+            keysym = self.XK.string_to_keysym(self.KEYSYMS.get(key, key))
+            code = self.display.keysym_to_keycode(keysym)
+            if not code:
+                raise ValueError(f"no keycode for {key!r}")
+            self.keycodes[key] = code
+        return code
+
+    def scroll(self, amount):
+        button = 4 if amount > 0 else 5
+        for _ in range(abs(amount)):
+            self.xtest.fake_input(self.display, self.X.ButtonPress, button)
+            self.xtest.fake_input(self.display, self.X.ButtonRelease, button)
+        self.display.flush()
+
+    def press(self, key, presses=1):
+        code = self._keycode(key)
+        for _ in range(presses):
+            self.xtest.fake_input(self.display, self.X.KeyPress, code)
+            self.xtest.fake_input(self.display, self.X.KeyRelease, code)
+        self.display.flush()
+
+    def hotkey(self, *keys):
+        codes = [self._keycode(key) for key in keys]
+        for code in codes:
+            self.xtest.fake_input(self.display, self.X.KeyPress, code)
+        for code in reversed(codes):
+            self.xtest.fake_input(self.display, self.X.KeyRelease, code)
+        self.display.flush()
+
+    def screenshot(self):
+        return pyautogui.screenshot() if pyautogui else None
+
+class UInputBackend:
+    """Linux: a persistent virtual keyboard + wheel device on /dev/uinput (python-evdev).
+
+    Works under X11 and Wayland alike; needs write access to /dev/uinput.
+    scroll(n) is one REL_WHEEL event of n notches.
+    """
+    name = "uinput"
+    KEYS = {"ctrl": "KEY_LEFTCTRL", "shift": "KEY_LEFTSHIFT", "alt": "KEY_LEFTALT",
+            "+": "KEY_EQUAL", "=": "KEY_EQUAL", "-": "KEY_MINUS",
+            "left": "KEY_LEFT", "right": "KEY_RIGHT", "up": "KEY_UP", "down": "KEY_DOWN"}
+
+    def __init__(self):
+        try:
+            from evdev import UInput, ecodes
+        except ImportError:
+            raise RuntimeError("the uinput backend needs evdev (pip install evdev)")
+        self.ecodes = ecodes
+        self.codes = {key: getattr(ecodes, name) for key, name in self.KEYS.items()}
+        for char in "0123456789abcdefghijklmnopqrstuvwxyz":
+            self.codes[char] = getattr(ecodes, f"KEY_{char.upper()}")
+        capabilities = {
+            # Buttons and X/Y make the device a pointer, so the wheel is accepted
+            ecodes.EV_KEY: sorted(set(self.codes.values())) + [ecodes.BTN_LEFT, ecodes.BTN_RIGHT],
+            ecodes.EV_REL: [ecodes.REL_X, ecodes.REL_Y, ecodes.REL_WHEEL],
+        }
+        try:
+            self.device = UInput(capabilities, name="hand-gesture-control")
+        except Exception as e:  # evdev.UInputError / PermissionError
+            raise RuntimeError(f"cannot open /dev/uinput: {e}")
+
+    def _code(self, key):
+        code = self.codes.get(key.lower())
+        if code is None:
+            raise ValueError(f"no key code for {key!r}")
+        return code
+
+    def scroll(self, amount):
+        self.device.write(self.ecodes.EV_REL, self.ecodes.REL_WHEEL, amount)
+        self.device.syn()
+
+    def press(self, key, presses=1):
+        code = self._code(key)
+        for _ in range(presses):
+            self.device.write(self.ecodes.EV_KEY, code, 1)
+            self.device.syn()
+            self.device.write(self.ecodes.EV_KEY, code, 0)
+            self.device.syn()
+
+    def hotkey(self, *keys):
+        codes = [self._code(key) for key in keys]
+        for code in codes:
+            self.device.write(self.ecodes.EV_KEY, code, 1)
+            self.device.syn()
+        for code in reversed(codes):
+            self.device.write(self.ecodes.EV_KEY, code, 0)
+            self.device.syn()
+
+    def screenshot(self):
+        return pyautogui.screenshot() if pyautogui else None
+
+class NullBackend:
+    """Injects nothing (measure the pipeline without OS input overhead)"""
+    name = "null"
+
+    def scroll(self, amount):
+        pass
+
+    def press(self, key, presses=1):
+        pass
+
+    def hotkey(self, *keys):
+        pass
+
+    def screenshot(self):
+        return None
+
+ACTION_BACKENDS = {
+    "pyautogui": PyAutoGuiBackend,
+    "xtest": XTestBackend,
+    "uinput": UInputBackend,
+    "record": RecordingBackend,
+    "null": NullBackend,
+}
+
+def create_backend(name):
+    return ACTION_BACKENDS[name]()
+
+# --- Action dispatcher ---
+class ActionDispatcher:
+    """Run actions on a worker thread through an action backend, so input
+    injection never blocks the frame loop.
+
+    Queued actions are coalesced while they wait: consecutive scrolls in the
+    same direction are summed, repeated presses of one key become a single
+    press(key, presses=n) and repeated identical hotkeys one entry run n
+    times. At most max_pending actions wait at once, anything beyond that is
+    dropped; the action methods return False then (True once queued or
+    merged). Queue wait and run time are tracked per action.
+
+    Actions can carry the capture timestamp (origin_ns) of the frame that
+    triggered them; when the backend call returns, the glass-to-action
+    latency is recorded per gesture in action_latency. A coalesced action
+    keeps the oldest timestamp.
+    """
+
+    def __init__(self, backend, max_pending=8):
+        self.backend = backend
+        self.max_pending = max_pending
+        self.pending = deque()  # [kind, arg, enqueue_time, gesture, origin_ns]
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # Counters / latency metrics
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.metrics = {}  # kind -> [count, total_wait, total_run, max_wait, max_run]
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="ActionDispatcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Finish the queued actions, then stop the worker"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+    # Public actions
+    def scroll(self, amount, gesture="scroll", origin_ns=None):
+        return self._submit("scroll", amount, gesture, origin_ns)
+
+    def press(self, key, gesture=None, origin_ns=None):
+        return self._submit("press", [key, 1], gesture, origin_ns)
+
+    def hotkey(self, *keys, gesture=None, origin_ns=None):
+        return self._submit("hotkey", [keys, 1], gesture, origin_ns)
+
+    def call(self, name, func, origin_ns=None):
+        """Run any other slow side effect (e.g. a screenshot) on the worker"""
+        return self._submit(name, func, name, origin_ns)
+
+    def _submit(self, kind, arg, gesture=None, origin_ns=None):
+        with self.cond:
+            self.submitted += 1
+            if self.pending:
+                last = self.pending[-1]
+                if kind == "scroll" and last[0] == "scroll" and (last[1] > 0) == (arg > 0):
+                    last[1] += arg
+                    self.coalesced += 1
+                    return True
+                if kind in ("press", "hotkey") and last[0] == kind and last[1][0] == arg[0]:
+                    last[1][1] += 1
+                    self.coalesced += 1
+                    return True
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending.append([kind, arg, time.perf_counter(), gesture, origin_ns])
+            self.cond.notify()
+            return True
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or not self.running)
+                if not self.pending:
+                    break
+                kind, arg, enqueue_time, gesture, origin_ns = self.pending.popleft()
+
+            start = time.perf_counter()
+            try:
+                self._execute(kind, arg)
+            except Exception as e:
+                print(f"Error running action {kind}: {e}")
+            end = time.perf_counter()
+            self._record(kind, start - enqueue_time, end - start)
+            if gesture and origin_ns is not None:
+                action_latency.add(gesture, time.perf_counter_ns() - origin_ns)
+
+    def _execute(self, kind, arg):
+        if kind == "scroll":
+            self.backend.scroll(arg)
+        elif kind == "press":
+            self.backend.press(arg[0], presses=arg[1])
+        elif kind == "hotkey":
+            for _ in range(arg[1]):
+                self.backend.hotkey(*arg[0])
+        else:
+            arg()
+
+    def _record(self, kind, wait, run):
+        m = self.metrics.setdefault(kind, [0, 0.0, 0.0, 0.0, 0.0])
+        m[0] += 1
+        m[1] += wait
+        m[2] += run
+        m[3] = max(m[3], wait)
+        m[4] = max(m[4], run)
+        stage_timer.add("action", int(run * 1e9))
+
+    def stats(self):
+        lines = [f"backend={self.backend.name} submitted={self.submitted} "
+                 f"coalesced={self.coalesced} dropped={self.dropped}"]
+        for kind, (count, wait, run, max_wait, max_run) in sorted(self.metrics.items()):
+            lines.append(f"  {kind}: n={count} wait avg={wait / count * 1000:.1f}ms "
+                         f"max={max_wait * 1000:.1f}ms | run avg={run / count * 1000:.1f}ms "
+                         f"max={max_run * 1000:.1f}ms")
+        return "\n".join(lines)
+
+# main() sets the backend chosen with --actions
+actions = ActionDispatcher(NullBackend())
+
+# --- Continuous scrolling ---
+class ContinuousScroller:
+    """Turn a scroll rate into small scroll increments.
+
+    The gesture sets the target rate (units/s) every frame; tick() eases
+    the current rate towards it and emits the whole units accumulated
+    since the last tick. A timer thread ticks at tick_hz; batch runs and
+    replay call tick() once per frame instead, on the gesture clock.
+    The rate falls back to 0 when no update came for release_after seconds.
+    """
+
+    def __init__(self, tick_hz=60, release_after=0.15, ramp=0.08):
+        self.interval = 1.0 / tick_hz
+        self.release_after = release_after
+        self.ramp = ramp
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self.emitted = 0
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.target = 0.0
+            self.rate = 0.0
+            self.remainder = 0.0
+            self.last_update = None
+            self.last_tick = None
+            self.origin_ns = None
+
+    def update(self, rate, origin_ns=None):
+        with self.lock:
+            if self.target == 0.0 and self.origin_ns is None:
+                # Latency is measured from the frame that started the scroll
+                self.origin_ns = origin_ns
+            self.target = rate
+            self.last_update = clock()
+
+    def tick(self):
+        now = clock()
+        with self.lock:
+            if self.last_tick is None:
+                self.last_tick = now
+                return 0
+            dt = now - self.last_tick
+            self.last_tick = now
+            if self.last_update is None or now - self.last_update > self.release_after:
+                self.target = 0.0
+            self.rate += (self.target - self.rate) * min(1.0, dt / self.ramp)
+            if self.target == 0.0 and abs(self.rate) < 1.0:
+                self.rate = self.remainder = 0.0
+            self.remainder += self.rate * dt
+            amount = int(self.remainder)
+            self.remainder -= amount
+            origin_ns = self.origin_ns if amount else None
+            if amount:
+                self.origin_ns = None
+        if amount:
+            self.emitted += abs(amount)
+            actions.scroll(amount, origin_ns=origin_ns)
+        return amount
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="ContinuousScroll", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            self.tick()
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+
+scroller = ContinuousScroller(scroll_tick_hz)
+
+# --- Screenshot writer ---
+class ScreenshotWriter:
+    """Encode and write screenshots on a small thread pool.
+
+    fmt is "png" (compress_level 0-9), "jpg" (quality 1-95) or "npy" (raw
+    pixels, no encoding). At most max_pending screenshots are encoded at
+    once, further ones are dropped. on_done(filename, error) is called from
+    the pool thread when a file is written.
+    """
+
+    def __init__(self, fmt="png", png_compression=1, jpeg_quality=90,
+                 workers=2, max_pending=4, on_done=None):
+        self.fmt = fmt
+        self.png_compression = png_compression
+        self.jpeg_quality = jpeg_quality
+        self.on_done = on_done
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ScreenshotWriter")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.index = 0
+        self.dropped = 0
+
+    def submit(self, image):
+        """Queue a PIL image for writing; return the filename or None if dropped"""
+        if not self.slots.acquire(blocking=False):
+            self.dropped += 1
+            print("Screenshot dropped: writer queue full")
+            return None
+        self.index += 1
+        ext = "jpg" if self.fmt == "jpg" else self.fmt
+        filename = f"screenshot_{self.index}_{int(time.time())}.{ext}"
+        self.pool.submit(self._write, image, filename)
+        return filename
+
+    def _write(self, image, filename):
+        error = None
+        try:
+            if self.fmt == "png":
+                image.save(filename, format="PNG", compress_level=self.png_compression)
+            elif self.fmt == "jpg":
+                image.convert("RGB").save(filename, format="JPEG", quality=self.jpeg_quality)
+            elif self.fmt == "npy":
+                np.save(filename, np.asarray(image))
+            else:
+                raise ValueError(f"unknown screenshot format {self.fmt!r}")
+        except Exception as e:
+            error = e
+        finally:
+            self.slots.release()
+        if self.on_done:
+            self.on_done(filename, error)
+
+    def close(self):
+        """Wait for pending screenshots to be written"""
+        self.pool.shutdown(wait=True)
+
+def on_screenshot_saved(filename, error):
+    """Writer callback: update the count shown on the overlay"""
+    global screenshot_count, last_screenshot_file
+    if error:
+        print(f"Error saving screenshot {filename}: {error}")
+        return
+    with screenshot_lock:
+        screenshot_count += 1
+        last_screenshot_file = filename
+    print(f"Screenshot saved: {filename}")
+
+screenshot_writer = None   # ScreenshotWriter, created in main()
+
+# --- Landmark layout ---
+# Finger order everywhere below: thumb, index, middle, ring, pinky
+FINGER_TIPS = np.array([4, 8, 12, 16, 20])
+FINGER_PIPS = np.array([3, 6, 10, 14, 18])
+FINGER_MCPS = np.array([1, 5, 9, 13, 17])
+THUMB, INDEX, MIDDLE, RING, PINKY = range(5)
+FINGER_BITS = 1 << np.arange(5)  # bit i set = finger i extended
+
+# --- Feature layer ---
+def landmarks_to_array(landmarks):
+    """Convert MediaPipe landmarks to a contiguous (21, 3) float32 array (x, y, z)"""
+    return np.fromiter((v for lm in landmarks for v in (lm.x, lm.y, lm.z)),
+                       dtype=np.float32, count=63).reshape(21, 3)
+
+def handedness_labels(results):
+    """MediaPipe's handedness label ("Left"/"Right") of each detected hand"""
+    return [handedness.classification[0].label for handedness in results.multi_handedness or []]
+
+def array_to_landmarks(pts):
+    """(21, 3) array -> NormalizedLandmarkList, for drawing predicted landmarks"""
+    return landmark_pb2.NormalizedLandmarkList(
+        landmark=[landmark_pb2.NormalizedLandmark(x=x, y=y, z=z) for x, y, z in pts.tolist()])
+
+def tip_distances(pts):
+    """Pairwise 2D distances between the 5 finger tips -> (5, 5) array"""
+    tips = pts[FINGER_TIPS, :2]
+    diff = tips[:, None, :] - tips[None, :, :]
+    return np.sqrt((diff ** 2).sum(axis=-1))
+
+def finger_lengths(pts):
+    """MCP->tip and MCP->PIP (x2.5, a fully extended finger) lengths for every finger"""
+    mcps = pts[FINGER_MCPS, :2]
+    length = np.linalg.norm(pts[FINGER_TIPS, :2] - mcps, axis=1)
+    full = np.linalg.norm(pts[FINGER_PIPS, :2] - mcps, axis=1) * 2.5
+    return length, full
+
+def finger_angles(pts):
+    """Pointing angle of every finger (PIP->tip), degrees clockwise from straight up, 0-360"""
+    d = pts[FINGER_TIPS, :2] - pts[FINGER_PIPS, :2]
+    return np.degrees(np.arctan2(d[:, 0], -d[:, 1])) % 360
+
+class HandFeatures:
+    """All per-frame hand features, computed once and shared by every gesture rule.
+
+    Finger flags are plain Python lists (thumb, index, middle, ring, pinky) so
+    the rules can index them cheaply.
+    """
+
+    def __init__(self, pts, frame_time=None, hand=None):
+        self.pts = pts
+        self.frame_time = frame_time  # perf_counter_ns when the camera frame was captured
+        self.hand = hand              # HandState of the hand these landmarks belong to
+        tips_y = pts[FINGER_TIPS, 1]
+        pips_y = pts[FINGER_PIPS, 1]
+        mcps_y = pts[FINGER_MCPS, 1]
+
+        # Finger extension states
+        self.up = (tips_y < pips_y).tolist()          # tip above PIP
+        self.down = (tips_y > pips_y).tolist()        # tip below PIP
+        self.above_mcp = (tips_y < mcps_y).tolist()   # tip above MCP
+        self.below_mcp = (tips_y > mcps_y).tolist()   # tip below MCP
+        self.thumb_tucked = bool(pts[4, 0] > pts[1, 0])
+        # 5-bit finger-extension mask (tip above PIP), key of the rule table
+        self.mask = int(FINGER_BITS[tips_y < pips_y].sum())
+
+        # Finger lengths (MCP->tip) and their fully extended estimate
+        self.length, self.full_length = finger_lengths(pts)
+
+        # Tip spreads: full distance matrix and x gap between neighbouring tips
+        # (thumb-index, index-middle, middle-ring, ring-pinky)
+        self.tip_dist = tip_distances(pts)
+        self.tip_spread = np.abs(np.diff(pts[FINGER_TIPS, 0])).tolist()
+
+        # Index pointing angle, degrees clockwise from straight up
+        self.index_angle = float(finger_angles(pts)[INDEX])
+
+        # Hand size (wrist -> middle MCP), to compare distances at any camera distance;
+        # the distance thresholds are multiplied by threshold_scale
+        self.hand_scale = max(float(np.hypot(*(pts[9, :2] - pts[0, :2]))), 1e-6)
+        self.threshold_scale = self.hand_scale / reference_hand_scale if normalize_thresholds else 1.0
+
+# --- Landmark smoothing ---
+class OneEuroFilter:
+    """One-Euro filter (Casiez et al. 2012) over a whole (21, 3) landmark array.
+
+    A low-pass filter whose cutoff rises with speed: still landmarks are
+    smoothed hard (cutoff ~ min_cutoff Hz), moving ones follow with little lag
+    (cutoff grows by beta per normalized unit/s). The speed is taken per
+    landmark, so a moving fingertip does not unsmooth the still wrist.
+    Restarts from the raw landmarks after a gap of reset_after seconds.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.0, d_cutoff=1.0, reset_after=0.5):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset_after = reset_after
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.dx = None
+        self.t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        return 1.0 / (1.0 + 1.0 / (2 * math.pi * cutoff * dt))
+
+    def __call__(self, pts, t):
+        dt = None if self.t is None else t - self.t
+        if dt is None or dt < 0 or dt > self.reset_after:
+            self.x = pts.astype(np.float32)
+            self.dx = np.zeros_like(self.x)
+            self.t = t
+            return self.x
+        if dt == 0:  # same timestamp as the last call
+            return self.x
+        self.t = t
+        self.dx = self.dx + self._alpha(self.d_cutoff, dt) * ((pts - self.x) / dt - self.dx)
+        speed = np.sqrt((self.dx * self.dx).sum(axis=1, keepdims=True))
+        cutoff = self.min_cutoff + self.beta * speed
+        self.x = self.x + self._alpha(cutoff, dt) * (pts - self.x)
+        return self.x
+
+# Filter settings per profile (None = raw landmarks). Moving gestures need
+# little lag, pose/threshold gestures (pinch distance, finger gaps) need
+# stable values more than fast ones.
+SMOOTHING_PROFILES = {
+    "raw": None,
+    "fast": dict(min_cutoff=2.0, beta=8.0),
+    "steady": dict(min_cutoff=0.8, beta=2.0),
+}
+
+# --- Preprocessing ---
+class BufferPool:
+    """Reusable named arrays, so the per-frame preprocessing allocates nothing"""
+
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, name, shape, dtype=np.uint8):
+        buf = self.buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype)
+            self.buffers[name] = buf
+        return buf
+
+buffers = BufferPool()
+
+def flip_frame(frame):
+    """Mirror the camera frame into the reused display buffer"""
+    return cv2.flip(frame, 1, dst=buffers.get("display", frame.shape))
+
+def to_inference_image(frame, width=None):
+    """Downscale the (flipped) BGR frame to the inference width and convert it to RGB"""
+    width = width or inference_width
+    # INTER_LINEAR: INTER_AREA looks slightly better but costs more than the inference it saves
+    if width and frame.shape[1] > width:
+        height = round(frame.shape[0] * width / frame.shape[1])
+        frame = cv2.resize(frame, (width, height), dst=buffers.get("small", (height, width, 3)),
+                           interpolation=cv2.INTER_LINEAR)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffers.get("rgb", frame.shape))
 
 # --- Helper functions ---
-def distance(p1, p2):
-    """Calculate distance between two points"""
-    return math.sqrt((p1.x - p2.x)**2 + (p1.y - p2.y)**2)
-
-def is_thumb_and_index_up(landmarks):
-    """Check if only thumb and index finger are up (for zoom)"""
-    thumb_up = landmarks[4].y < landmarks[3].y
-    index_up = landmarks[8].y < landmarks[6].y
-    middle_up = landmarks[12].y < landmarks[10].y
-    ring_up = landmarks[16].y < landmarks[14].y
-    pinky_up = landmarks[20].y < landmarks[18].y
-    return thumb_up and index_up and not (middle_up or ring_up or pinky_up)
-
-def is_all_fingers_up(landmarks):
-    """Check if all fingers are up (for zoom reset)"""
-    return (landmarks[4].y < landmarks[3].y and
-            landmarks[8].y < landmarks[6].y and
-            landmarks[12].y < landmarks[10].y and
-            landmarks[16].y < landmarks[14].y and
-            landmarks[20].y < landmarks[18].y)
-
-def is_three_fingers_up(landmarks):
+def is_three_fingers_up(f):
     """Check if 3 fingers are up (index, middle, ring) for screenshot"""
-    try:
-        # Check if 3 fingers are up
-        index_up = landmarks[8].y < landmarks[6].y   # Index finger
-        middle_up = landmarks[12].y < landmarks[10].y  # Middle finger  
-        ring_up = landmarks[16].y < landmarks[14].y    # Ring finger
-        
-        # Check if pinky is down
-        pinky_down = landmarks[20].y > landmarks[18].y
-        
-        # Check if fingers are separated
-        index_middle_separated = abs(landmarks[8].x - landmarks[12].x) > 0.03
-        middle_ring_separated = abs(landmarks[12].x - landmarks[16].x) > 0.03
-        
-        return (index_up and middle_up and ring_up and pinky_down and 
-                index_middle_separated and middle_ring_separated)
-    except:
-        return False
+    up = f.up
+    # Check if fingers are separated
+    separation = finger_separation * f.threshold_scale
+    if f.hand.gestures.held("screenshot"):
+        separation *= 1 - hysteresis
+    index_middle_separated = f.tip_spread[INDEX] > separation
+    middle_ring_separated = f.tip_spread[MIDDLE] > separation
+
+    return (up[INDEX] and up[MIDDLE] and up[RING] and f.down[PINKY] and
+            index_middle_separated and middle_ring_separated)
 
-def is_two_fingers_horizontal(landmarks):
+def is_two_fingers_horizontal(f):
     """Check if index and middle fingers are up for horizontal scrolling"""
-    try:
-        # Check finger positions
-        index_tip = landmarks[8]
-        middle_tip = landmarks[12]
-        index_mcp = landmarks[5]
-        middle_mcp = landmarks[9]
-        
-        # Check if fingers are up
-        index_up = index_tip.y < index_mcp.y
-        middle_up = middle_tip.y < middle_mcp.y
-        
-        # Check thumb position (should be down for horizontal scroll)
-        thumb_tip = landmarks[4]
-        thumb_mcp = landmarks[1]
-        thumb_down = thumb_tip.x > thumb_mcp.x
-        
-        # Check other fingers are down
-        ring_tip = landmarks[16]
-        ring_mcp = landmarks[13]
-        ring_down = ring_tip.y > ring_mcp.y
-        
-        pinky_tip = landmarks[20]
-        pinky_mcp = landmarks[17]
-        pinky_down = pinky_tip.y > pinky_mcp.y
-        
-        return index_up and middle_up and thumb_down and ring_down and pinky_down
-    except:
-        return False
+    # Tip vs MCP (not PIP) here, thumb should be tucked in
+    return (f.above_mcp[INDEX] and f.above_mcp[MIDDLE] and f.thumb_tucked and
+            f.below_mcp[RING] and f.below_mcp[PINKY])
 
-def is_hand_closed(landmarks):
-    """Check if hand is closed (fist)"""
-    try:
-        return landmarks[8].y > landmarks[6].y  # Index finger folded
-    except:
-        return True
+def pick_direction(value, threshold, state, below, above):
+    """below/above the threshold, keeping the held direction until value passes it by the hysteresis margin"""
+    previous = state.data.get("direction")
+    if previous == below and value < threshold * (1 + hysteresis):
+        return below
+    if previous == above and value > threshold * (1 - hysteresis):
+        return above
+    direction = below if value < threshold else above
+    state.data["direction"] = direction
+    return direction
+
+def calculate_zoom_gesture(f, state):
+    """Zoom in/out based on thumb-index distance"""
+    dist = float(f.tip_dist[THUMB, INDEX])
+    threshold = zoom_threshold * f.threshold_scale
+    if pick_direction(dist, threshold, state, "out", "in") == "in":
+        actions.hotkey('ctrl', '+', gesture="zoom", origin_ns=f.frame_time)
+        return "Zoom In"
+    actions.hotkey('ctrl', '-', gesture="zoom", origin_ns=f.frame_time)
+    return "Zoom Out"
+
+def zoom_by_change(value, step, state, origin_ns=None):
+    """Zoom in/out by one step per `step` that value grew/shrank since the gesture started"""
+    # Let the hand (and the smoothed landmarks) settle into the pose first
+    if clock() - state.active_since < zoom_settle:
+        state.data["baseline"] = value
+        state.data["steps"] = 0
+        return None
+    baseline, done = state.data["baseline"], state.data["steps"]
 
-def calculate_zoom_gesture(thumb_tip, index_tip):
-    """Calculate zoom in/out based on thumb-index distance"""
-    global prev_distance, last_zoom_time
-    current_time = time.time()
-    dist = distance(thumb_tip, index_tip)
+    # A full step of hysteresis: going back needs the value to move a whole step back
+    position = (value - baseline) / step
+    if position >= done + 1:
+        steps = min(math.floor(position) - done, zoom_max_steps)
+    elif position <= done - 1:
+        steps = max(math.ceil(position) - done, -zoom_max_steps)
+    else:
+        return None
 
-    if (current_time - last_zoom_time) < zoom_cooldown:
+    # Only count the steps that were queued, so the baseline keeps matching the browser
+    key = '+' if steps > 0 else '-'
+    queued = 0
+    for _ in range(abs(steps)):
+        if not actions.hotkey('ctrl', key, gesture="zoom", origin_ns=origin_ns):
+            break
+        queued += 1
+    if not queued:
         return None
+    state.data["steps"] = done + (queued if steps > 0 else -queued)
+    return f"Zoom {'In' if steps > 0 else 'Out'} x{queued}"
+
+def proportional_zoom(f, state):
+    """Zoom by how far the pinch opened/closed since the gesture started (in hand sizes)"""
+    dist = float(f.tip_dist[THUMB, INDEX]) / f.hand_scale
+    return zoom_by_change(dist, zoom_step, state, f.frame_time)
+
+def spread_zoom(pair, state):
+    """Two open hands: zoom by how far they moved apart/together (in hand sizes)"""
+    a, b = pair
+    dist = float(np.hypot(*(a.pts[9, :2] - b.pts[9, :2]))) / ((a.hand_scale + b.hand_scale) / 2)
+    return zoom_by_change(dist, spread_zoom_step, state, a.frame_time)
 
-    threshold = 0.13
-    if prev_distance is not None:
-        if dist > threshold:
-            pyautogui.hotkey('ctrl', '+')
-            last_zoom_time = current_time
-            return "Zoom In"
-        elif dist < threshold:
-            pyautogui.hotkey('ctrl', '-')
-            last_zoom_time = current_time
-            return "Zoom Out"
-    prev_distance = dist
-    return None
-
-def detect_scroll_gesture(landmarks):
+def zoom_gesture(f, state):
+    if continuous_zoom:
+        return proportional_zoom(f, state)
+    return calculate_zoom_gesture(f, state)
+
+def detect_scroll_gesture(f):
     """Detect vertical scroll gesture"""
-    global last_gesture, last_scroll_time
-    index_tip = landmarks[8]
-    index_pip = landmarks[6]
-    index_mcp = landmarks[5]
-    middle_tip = landmarks[12]
-    ring_tip = landmarks[16]
-    pinky_tip = landmarks[20]
-    middle_mcp = landmarks[9]
-    ring_mcp = landmarks[13]
-    pinky_mcp = landmarks[17]
-
-    # Calculate finger lengths
-    def length(mcp, tip, pip):
-        return distance(mcp, tip), distance(mcp, pip) * 2.5
-
-    index_len, index_full = length(index_mcp, index_tip, index_pip)
-    middle_len, middle_full = length(middle_mcp, middle_tip, landmarks[10])
-    ring_len, ring_full = length(ring_mcp, ring_tip, landmarks[14])
-    pinky_len, pinky_full = length(pinky_mcp, pinky_tip, landmarks[18])
+    length, full = f.length, f.full_length
 
     fist_threshold = 0.6
-    is_fist = (index_len < index_full * fist_threshold and
-               middle_len < middle_full * fist_threshold and
-               ring_len < ring_full * fist_threshold and
-               pinky_len < pinky_full * fist_threshold)
+    is_fist = (length[INDEX:] < full[INDEX:] * fist_threshold).all()
 
     if is_fist:
         return "stop"
 
-    others_folded = (
-        middle_tip.y > index_pip.y and
-        ring_tip.y > index_pip.y and
-        pinky_tip.y > index_pip.y
-    )
+    # Middle, ring and pinky tips below the index PIP
+    others_folded = (f.pts[FINGER_TIPS[MIDDLE:], 1] > f.pts[6, 1]).all()
 
-    if others_folded and index_len > index_full * 0.7:
-        dx = index_tip.x - index_pip.x
-        dy = index_tip.y - index_pip.y
-        angle_rad = math.atan2(dx, -dy)
-        angle_deg = math.degrees(angle_rad)
-        if angle_deg < 0:
-            angle_deg += 360
+    # Wider limits while already scrolling
+    gestures = f.hand.gestures
+    held = 1 + hysteresis if gestures.held("scroll_up") or gestures.held("scroll_down") else 1
+    if others_folded and length[INDEX] > full[INDEX] * 0.7 / held:
+        angle_deg = f.index_angle
 
-        if angle_deg < 30 or angle_deg > 330:
+        if angle_deg < 30 * held or angle_deg > 360 - 30 * held:
             return "scroll_up"
-        elif 150 < angle_deg < 210:
+        elif 180 - 30 * held < angle_deg < 180 + 30 * held:
             return "scroll_down"
     return "stop"
 
-def detect_horizontal_scroll(landmarks):
-    """Detect horizontal scroll gesture"""
-    global last_horizontal_scroll_time
-    
-    if not is_two_fingers_horizontal(landmarks):
-        return None
-    
-    current_time = time.time()
-    if current_time - last_horizontal_scroll_time < horizontal_scroll_cooldown:
-        return None
-    
-    index_tip = landmarks[8]
-    middle_tip = landmarks[12]
-    
+def horizontal_scroll(f, state):
+    """Press left/right depending on the index-middle spread"""
     # Calculate distance between fingers
-    finger_distance = abs(index_tip.x - middle_tip.x)
-    
-    if finger_distance < distance_threshold:
-        pyautogui.press('right')
-        last_horizontal_scroll_time = current_time
-        return "RIGHT"
-    elif finger_distance > distance_threshold:
-        pyautogui.press('left')
-        last_horizontal_scroll_time = current_time
-        return "LEFT"
-    
-    return None
-
-def take_screenshot():
-    """Take screenshot when gesture is detected"""
-    global last_screenshot_time, screenshot_count
-    
-    current_time = time.time()
-    if current_time - last_screenshot_time > screenshot_cooldown:
-        try:
-            screenshot = pyautogui.screenshot()
-            screenshot_count += 1
-            
-            filename = f"screenshot_{screenshot_count}_{int(time.time())}.png"
-            screenshot.save(filename)
-            
-            print(f"Screenshot saved: {filename}")
-            last_screenshot_time = current_time
-            return "SCREENSHOT TAKEN!"
-        except Exception as e:
-            print(f"Error taking screenshot: {e}")
-            return None
-    return None
+    finger_distance = f.tip_spread[INDEX]
+    threshold = distance_threshold * f.threshold_scale
 
-# --- Main Program ---
-cap = cv2.VideoCapture(0)
-cap.set(cv2.CAP_PROP_FPS, 30)
-
-if not cap.isOpened():
-    print("❌ ไม่สามารถเปิดกล้องได้")
-    exit()
-
-print("✅ เปิดกล้องสำเร็จ — กด 'q' เพื่อออก")
-print("Gestures:")
-print("- Thumb + Index: Zoom In/Out")
-print("- All fingers up: Reset Zoom")
-print("- Index finger pointing: Vertical Scroll")
-print("- Index + Middle (horizontal): Left/Right")
-print("- 3 fingers up (index+middle+ring): Screenshot")
-
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    frame = cv2.flip(frame, 1)
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = hands.process(rgb)
+    if pick_direction(finger_distance, threshold, state, "right", "left") == "right":
+        actions.press('right', gesture="horizontal", origin_ns=f.frame_time)
+        return "Horizontal Scroll RIGHT"
+    actions.press('left', gesture="horizontal", origin_ns=f.frame_time)
+    return "Horizontal Scroll LEFT"
 
-    status_text = ""
-    current_time = time.time()
-
-    if results.multi_hand_landmarks:
-        for hand_landmarks in results.multi_hand_landmarks:
-            mp_draw.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-            landmarks = hand_landmarks.landmark
-
-            # Priority 1: Screenshot (3 fingers up)
-            if not is_hand_closed(landmarks) and is_three_fingers_up(landmarks):
-                screenshot_result = take_screenshot()
-                if screenshot_result:
-                    status_text = screenshot_result
-                continue
+def scroll_rate(f, direction):
+    """Scroll rate (units/s, negative = down) from how straight the index points"""
+    angle = f.index_angle
+    if direction == "scroll_up":
+        off = min(angle, 360 - angle)
+    else:
+        off = abs(angle - 180)
+    rate = scroll_min_rate + (scroll_max_rate - scroll_min_rate) * max(0.0, 1 - off / 30)
+    return rate if direction == "scroll_up" else -rate
 
-            # Priority 2: Horizontal scroll (2 fingers horizontal)
-            horizontal_scroll = detect_horizontal_scroll(landmarks)
-            if horizontal_scroll:
-                status_text = f"Horizontal Scroll {horizontal_scroll}"
-                continue
+def vertical_scroll(f, direction):
+    """Scroll up/down: at a tilt-dependent rate, or one scroll_amount step"""
+    if continuous_scroll:
+        rate = scroll_rate(f, direction)
+        scroller.update(rate, f.frame_time)
+        return f"Scroll {'Up' if rate > 0 else 'Down'} {abs(rate):.0f}/s"
+
+    if direction == "scroll_up":
+        actions.scroll(scroll_amount, origin_ns=f.frame_time)
+        return "Scroll Up"
+    actions.scroll(-scroll_amount, origin_ns=f.frame_time)
+    return "Scroll Down"
 
-            # Priority 3: Vertical scroll
-            scroll_gesture = detect_scroll_gesture(landmarks)
-            scroll_detected = False
-            
-            if scroll_gesture in ["scroll_up", "scroll_down"]:
-                if (scroll_gesture != last_gesture) or (current_time - last_scroll_time > scroll_cooldown):
-                    if scroll_gesture == "scroll_up":
-                        pyautogui.scroll(scroll_amount)
-                        status_text = "Scroll Up"
-                    elif scroll_gesture == "scroll_down":
-                        pyautogui.scroll(-scroll_amount)
-                        status_text = "Scroll Down"
-                    last_gesture = scroll_gesture
-                    last_scroll_time = current_time
-                    scroll_detected = True
-
-            # Priority 4: Zoom (only if no scroll detected)
-            if not scroll_detected:
-                if is_thumb_and_index_up(landmarks):
-                    zoom_action = calculate_zoom_gesture(landmarks[4], landmarks[8])
-                    if zoom_action:
-                        status_text = zoom_action
-
-            # Priority 5: Reset Zoom
-            if is_all_fingers_up(landmarks) and (current_time - last_reset_time) > reset_cooldown:
-                pyautogui.hotkey('ctrl', '0')
-                last_reset_time = current_time
-                status_text = "Reset Zoom"
-
-    # Display status and instructions
+def reset_zoom(f, state):
+    """Reset browser zoom (ctrl+0)"""
+    actions.hotkey('ctrl', '0', gesture="reset", origin_ns=f.frame_time)
+    return "Reset Zoom"
+
+def take_screenshot(f, state):
+    """Take screenshot when gesture is detected (grabbed on the action worker, saved by the writer pool)"""
+    actions.call("screenshot", save_screenshot, origin_ns=f.frame_time)
+    return "SCREENSHOT TAKEN!"
+
+def save_screenshot():
+    """Grab the screen and hand the image to the background writer"""
+    try:
+        image = actions.backend.screenshot()
+        if image is not None and screenshot_writer:
+            screenshot_writer.submit(image)
+    except Exception as e:
+        print(f"Error taking screenshot: {e}")
+
+# --- Gesture rule table ---
+# fingers: thumb..pinky, '1' = extended (tip above PIP), '0' = not extended, '-' = any.
+# The table is compiled into a lookup on HandFeatures.mask, so a frame only
+# evaluates the predicates of rules that can match its finger state. The first
+# rule (lowest priority number) whose predicates pass handles the frame;
+# its action(features, state) runs when the gesture state machine says so.
+GestureRule = namedtuple("GestureRule", "name fingers predicates priority action smoothing")
+
+GESTURE_RULES = [
+    GestureRule("screenshot", "-1110", (is_three_fingers_up,), 1,
+                take_screenshot, "steady"),
+    # Tip-vs-MCP test, so it cannot be narrowed by the (tip-vs-PIP) mask
+    GestureRule("horizontal_scroll", "-----", (is_two_fingers_horizontal,), 2,
+                horizontal_scroll, "fast"),
+    # Thumb + index up is zoom even when the index also points like a scroll
+    GestureRule("zoom", "11000", (), 3, zoom_gesture, "steady"),
+    GestureRule("scroll_up", "-1---", (lambda f: detect_scroll_gesture(f) == "scroll_up",), 4,
+                lambda f, state: vertical_scroll(f, "scroll_up"), "fast"),
+    GestureRule("scroll_down", "-0---", (lambda f: detect_scroll_gesture(f) == "scroll_down",), 4,
+                lambda f, state: vertical_scroll(f, "scroll_down"), "fast"),
+    GestureRule("reset_zoom", "11111", (), 5, reset_zoom, "steady"),
+]
+
+def compile_rules(rules):
+    """Build the 32-entry lookup: finger mask -> rules that can match it, by priority"""
+    table = [[] for _ in range(32)]
+    for rule in sorted(rules, key=lambda r: r.priority):
+        care = sum(1 << i for i, c in enumerate(rule.fingers) if c != '-')
+        want = sum(1 << i for i, c in enumerate(rule.fingers) if c == '1')
+        for mask in range(32):
+            if mask & care == want:
+                table[mask].append(rule)
+    return [tuple(rules) for rules in table]
+
+# One lookup per smoothing profile: a rule is matched against the features
+# of its own profile's landmarks
+RULE_TABLES = {profile: compile_rules([r for r in GESTURE_RULES if r.smoothing == profile])
+               for profile in sorted({r.smoothing for r in GESTURE_RULES})}
+
+def hand_features(pts, hand, frame_time=None):
+    """HandFeatures per smoothing profile, through the hand's own filters"""
+    hand.smooth(pts, clock())
+    return {profile: hand.feature(profile, frame_time) for profile in RULE_TABLES}
+
+def classify(feats):
+    """Return (rule, features) for the rule that handles this frame, or (None, None)"""
+    candidates = [(rule, f) for profile, f in feats.items() for rule in RULE_TABLES[profile][f.mask]]
+    candidates.sort(key=lambda c: c[0].priority)
+    for rule, f in candidates:
+        if all(predicate(f) for predicate in rule.predicates):
+            return rule, f
+    return None, None
+
+# --- Learned classifier ---
+RULES_BY_NAME = {rule.name: rule for rule in GESTURE_RULES}
+
+def normalize_hands(hands_pts):
+    """(n, 21, 3) landmarks -> (n, 63) vectors: wrist at the origin, hand size 1"""
+    rel = hands_pts - hands_pts[:, :1]
+    scale = np.maximum(np.hypot(rel[:, 9, 0], rel[:, 9, 1]), 1e-6)
+    return (rel / scale[:, None, None]).reshape(len(hands_pts), -1)
+
+class GestureClassifier:
+    """Tiny MLP (63 -> hidden ReLU -> classes) over normalized landmarks,
+    trained by train_classifier.py.
+
+    The input standardization is folded into the first layer at load time,
+    and all hands of a frame go through one batched forward pass. Classes
+    are single-hand rule names plus "none"; a prediction below min_prob
+    counts as no gesture. The landmarks come from the `profile` smoothing
+    profile the model was trained on.
+    """
+
+    def __init__(self, path, min_prob=0.6):
+        with np.load(path) as data:
+            mean, std = data["mean"], data["std"]
+            w1, b1 = data["w1"], data["b1"]
+            self.w1 = (w1 / std[:, None]).astype(np.float32)
+            self.b1 = (b1 - (mean / std) @ w1).astype(np.float32)
+            self.w2 = data["w2"].astype(np.float32)
+            self.b2 = data["b2"].astype(np.float32)
+            self.classes = [str(name) for name in data["classes"]]
+            self.profile = str(data["profile"])
+        unknown = set(self.classes) - set(RULES_BY_NAME) - {"none"}
+        if unknown:
+            raise ValueError(f"{path}: unknown gesture classes {sorted(unknown)}")
+        self.min_prob = min_prob
+
+    def predict_proba(self, x):
+        hidden = np.maximum(x @ self.w1 + self.b1, 0)
+        logits = hidden @ self.w2 + self.b2
+        logits -= logits.max(axis=1, keepdims=True)
+        prob = np.exp(logits)
+        return prob / prob.sum(axis=1, keepdims=True)
+
+    def predict(self, hands_pts):
+        """Gesture name (None = no gesture) for each (21, 3) landmark array"""
+        prob = self.predict_proba(normalize_hands(np.stack(hands_pts)))
+        best = prob.argmax(axis=1)
+        names = []
+        for i, k in enumerate(best):
+            name = self.classes[k]
+            names.append(name if prob[i, k] >= self.min_prob and name != "none" else None)
+        return names
+
+# main() loads one with --classifier; None = the rule cascade decides
+classifier = None
+
+# --- Gesture state machine ---
+class GestureState:
+    """idle -> candidate -> active -> release -> idle, for one gesture.
+
+    A gesture seen in `confirm` consecutive frames becomes active and its
+    action fires, then again every `repeat` seconds while it stays seen
+    (None = only once, 0 = every frame). Missing for up to `release` frames
+    it waits in release and resumes without re-confirming or re-firing.
+    `data` holds the action's own state for the current hold.
+    """
+
+    def __init__(self, name, confirm=3, release=3, repeat=None):
+        self.name = name
+        self.confirm = confirm
+        self.release = release
+        self.repeat = repeat
+        self.reset()
+
+    def reset(self):
+        self.state = "idle"
+        self.frames = 0
+        self.active_since = None
+        self.last_fire = None
+        self.data = {}
+
+    def update(self, seen, now):
+        """Advance one frame; return True if the action should run now"""
+        if not seen:
+            if self.state == "candidate":
+                self.state = "idle"
+            elif self.state == "active":
+                self.state = "release"
+                self.frames = 0
+            if self.state == "release":
+                self.frames += 1
+                if self.frames >= self.release:
+                    self.reset()
+            return False
+
+        if self.state == "idle":
+            self.state = "candidate"
+            self.frames = 0
+        if self.state == "candidate":
+            self.frames += 1
+            if self.frames < self.confirm:
+                return False
+            self.state = "active"
+            self.active_since = now
+        elif self.state == "release":
+            self.state = "active"
+
+        repeat = self.repeat() if callable(self.repeat) else self.repeat
+        if self.last_fire is None or (repeat is not None and now - self.last_fire >= repeat):
+            self.last_fire = now
+            return True
+        return False
+
+class GestureTracker:
+    """The GestureState of every rule; feeds them the classified rule each frame.
+
+    A hand that was not seen for stale_after seconds starts from idle.
+    """
+
+    def __init__(self, rules, timing, stale_after=0.5):
+        self.states = {rule.name: GestureState(rule.name, **timing.get(rule.name, {})) for rule in rules}
+        self.stale_after = stale_after
+        self.last_time = None
+
+    def held(self, name):
+        return self.states[name].state in ("active", "release")
+
+    def update(self, rule, feat, now):
+        """Advance every gesture by one frame; return the status text of the action run, or None"""
+        if self.last_time is not None and now - self.last_time > self.stale_after:
+            self.reset()
+        self.last_time = now
+        status = None
+        for name, state in self.states.items():
+            if state.update(rule is not None and rule.name == name, now):
+                status = rule.action(feat, state)
+        return status
+
+    def reset(self):
+        for state in self.states.values():
+            state.reset()
+        self.last_time = None
+
+# --- Per-hand state ---
+class HandState:
+    """What the gesture layer keeps for one tracked hand: its smoothing
+    filters, its gesture states and the landmarks/features of its last frame"""
+
+    def __init__(self, key, label=None):
+        self.key = key
+        self.label = label  # MediaPipe handedness ("Left"/"Right"), None if unknown
+        self.filters = {name: OneEuroFilter(**params) for name, params in SMOOTHING_PROFILES.items() if params}
+        self.gestures = GestureTracker(GESTURE_RULES, GESTURE_TIMING)
+        self.smoothed = {}  # profile -> landmarks
+        self.features = {}  # profile -> HandFeatures, built on first use
+        self.pts = None
+        self.last_seen = None
+
+    def smooth(self, pts, now):
+        """Run this frame's landmarks through the filters of every profile the rules use"""
+        self.pts = pts
+        self.smoothed = {}
+        for profile in RULE_TABLES:
+            filt = self.filters.get(profile) if smoothing else None
+            self.smoothed[profile] = pts if filt is None else filt(pts, now)
+        self.features = {}
+
+    def feature(self, profile, frame_time=None):
+        """This frame's HandFeatures for one profile; profiles with the same landmarks share one"""
+        feat = self.features.get(profile)
+        if feat is None:
+            pts = self.smoothed[profile]
+            for other in self.features.values():
+                if other.pts is pts:
+                    feat = other
+                    break
+            else:
+                feat = HandFeatures(pts, frame_time, self)
+            self.features[profile] = feat
+        return feat
+
+class HandRegistry:
+    """Give every detected hand its HandState from the previous frames.
+
+    MediaPipe has no tracking ids, so a hand is matched to the nearest
+    (by wrist position) state within max_jump; a different handedness label
+    counts as max_jump extra. A lone hand always keeps the lone state.
+    States not seen for stale_after seconds are dropped.
+    """
+
+    def __init__(self, max_jump=0.25, stale_after=0.5):
+        self.max_jump = max_jump
+        self.stale_after = stale_after
+        self.hands = []
+        self.created = 0
+
+    def match(self, hands_pts, labels, now):
+        self.hands = [h for h in self.hands if now - h.last_seen <= self.stale_after]
+        free = list(self.hands)
+        matched = []
+        for pts, label in zip(hands_pts, labels):
+            best, best_dist = None, self.max_jump
+            for hand in free:
+                dist = float(np.hypot(*(pts[0, :2] - hand.pts[0, :2])))
+                if label is not None and hand.label is not None and label != hand.label:
+                    dist += self.max_jump
+                if dist < best_dist:
+                    best, best_dist = hand, dist
+            if best is None and len(hands_pts) == 1 and len(free) == 1:
+                best = free[0]
+            if best is None:
+                self.created += 1
+                best = HandState(f"{label or 'hand'}-{self.created}", label)
+                self.hands.append(best)
+            else:
+                free.remove(best)
+            best.pts = pts
+            best.label = label or best.label
+            best.last_seen = now
+            matched.append(best)
+        return matched
+
+    def reset(self):
+        self.hands = []
+
+hand_registry = HandRegistry()
+
+# --- Two-hand gestures ---
+# Checked on the first two hands before their single-hand rules; while one
+# matches, those two hands run no single-hand gesture.
+TwoHandRule = namedtuple("TwoHandRule", "name predicate action smoothing")
+
+TWO_HAND_RULES = [
+    TwoHandRule("spread_zoom", lambda a, b: all(a.up) and all(b.up), spread_zoom, "steady"),
+]
+
+two_hand_gestures = GestureTracker(TWO_HAND_RULES, GESTURE_TIMING)
+
+def handle_hands(hands_pts, labels=None, frame_time=None):
+    """Run the gesture layer on every hand of a frame; return the status texts"""
+    now = clock()
+    hands = hand_registry.match(hands_pts, labels or [None] * len(hands_pts), now)
+    for pts, hand in zip(hands_pts, hands):
+        hand.smooth(pts, now)
+    # Hands not seen this frame still advance their gestures (as "not seen"),
+    # so a hold is not resumed across frames without that hand
+    for hand in hand_registry.hands:
+        if hand not in hands:
+            hand.gestures.update(None, None, now)
+    # Features are computed at most once per hand, frame and profile; every gesture rule reads them
+    statuses = []
+
+    pair_rule = None
+    if len(hands) >= 2:
+        for rule in TWO_HAND_RULES:
+            pair = (hands[0].feature(rule.smoothing, frame_time), hands[1].feature(rule.smoothing, frame_time))
+            if rule.predicate(*pair):
+                pair_rule = rule
+                break
+    status = two_hand_gestures.update(pair_rule, pair if pair_rule else None, now)
+    if status:
+        statuses.append(status)
+
+    if classifier and hands:
+        # One batched prediction for all hands; features are only built for
+        # the profile of the predicted rule, whose action reads them
+        names = classifier.predict([hand.smoothed.get(classifier.profile, hand.pts) for hand in hands])
+        decided = []
+        for name, hand in zip(names, hands):
+            rule = RULES_BY_NAME[name] if name else None
+            decided.append((rule, hand.feature(rule.smoothing, frame_time) if rule else None))
+    else:
+        decided = [classify({profile: hand.feature(profile, frame_time) for profile in RULE_TABLES})
+                   for hand in hands]
+
+    for i, (hand, (rule, feat)) in enumerate(zip(hands, decided)):
+        if pair_rule and i < 2:
+            rule, feat = None, None
+        status = hand.gestures.update(rule, feat, now)
+        if status:
+            statuses.append(status)
+    return statuses
+
+def reset_gesture_state():
+    """Forget hands, gesture states and smoothing (e.g. before replaying a recording again)"""
+    hand_registry.reset()
+    two_hand_gestures.reset()
+    scroller.reset()
+
+# --- ROI tracking ---
+class RoiTracker:
+    """Run hand inference on a crop around where the hand is expected to be.
+
+    The crop is the previous frame's landmark bounding box, moved by the
+    hand's last per-frame velocity, padded and made square (shifted back
+    inside the frame at the edges). It is cut from the full-resolution
+    frame and downscaled to at most input_size (never enlarged; sizes are
+    rounded down to multiples of 32 so the buffers are reused). If no hand
+    is found in the crop (or there was no hand last frame) the whole frame,
+    downscaled to inference_width, is processed instead. Returned landmarks
+    are always in full-frame normalized coordinates.
+
+    prepare(frame) builds the inference image, process(hands, image) runs
+    the model on it, so the two can be timed as separate stages.
+    """
+
+    def __init__(self, enabled=True, padding=0.6, min_size=120, input_size=256):
+        self.enabled = enabled
+        self.padding = padding
+        self.min_size = min_size  # pixels of the full-resolution frame
+        self.input_size = input_size
+        self.box = None           # (cx, cy, size) in full-resolution pixels
+        self.velocity = (0.0, 0.0)
+        self.frame = None
+        self.crop = None          # (x0, y0, x1, y1) of the prepared crop, None = full frame
+
+        # Metrics
+        self.roi_frames = 0
+        self.roi_hits = 0
+        self.full_frames = 0
+        self.roi_time = 0.0
+        self.full_time = 0.0
+        self.last_inference_ms = 0.0
+
+    def prepare(self, frame):
+        """RGB inference image for this (flipped, full-resolution BGR) frame"""
+        self.frame = frame
+        if not (self.enabled and self.box is not None):
+            self.crop = None
+            return to_inference_image(frame)
+        h, w = frame.shape[:2]
+        self.crop = x0, y0, x1, y1 = self._predict(w, h)
+        size = max(32, min(self.input_size, (x1 - x0) // 32 * 32))
+        small = cv2.resize(frame[y0:y1, x0:x1], (size, size), dst=buffers.get(f"roi{size}", (size, size, 3)),
+                           interpolation=cv2.INTER_LINEAR)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=buffers.get(f"roi_rgb{size}", (size, size, 3)))
+
+    def process(self, hands, rgb):
+        h, w = self.frame.shape[:2]
+        if self.crop is not None:
+            x0, y0, x1, y1 = self.crop
+            start = time.perf_counter()
+            results = hands.process(rgb)
+            self.last_inference_ms = (time.perf_counter() - start) * 1000
+            self.roi_time += self.last_inference_ms
+            self.roi_frames += 1
+
+            if results.multi_hand_landmarks:
+                self.roi_hits += 1
+                # Crop coordinates -> full-frame coordinates
+                cw, ch = x1 - x0, y1 - y0
+                for hand_landmarks in results.multi_hand_landmarks:
+                    for lm in hand_landmarks.landmark:
+                        lm.x = (x0 + lm.x * cw) / w
+                        lm.y = (y0 + lm.y * ch) / h
+                        lm.z = lm.z * cw / w
+                self._update(results, w, h)
+                return results
+            rgb = to_inference_image(self.frame)
+
+        # Hand lost (or ROI off): full-frame detection
+        start = time.perf_counter()
+        results = hands.process(rgb)
+        self.last_inference_ms = (time.perf_counter() - start) * 1000
+        self.full_time += self.last_inference_ms
+        self.full_frames += 1
+        if results.multi_hand_landmarks:
+            self._update(results, w, h)
+        else:
+            self.box = None
+            self.velocity = (0.0, 0.0)
+        return results
+
+    def _update(self, results, w, h):
+        pts = landmarks_to_array(results.multi_hand_landmarks[0].landmark)
+        xs = pts[:, 0] * w
+        ys = pts[:, 1] * h
+        cx = float(xs.min() + xs.max()) / 2
+        cy = float(ys.min() + ys.max()) / 2
+        size = max(float(xs.max() - xs.min()), float(ys.max() - ys.min()))
+        if self.box is not None:
+            self.velocity = (cx - self.box[0], cy - self.box[1])
+        self.box = (cx, cy, max(size * (1 + 2 * self.padding), self.min_size))
+
+    def _predict(self, w, h):
+        cx, cy, size = self.box
+        cx += self.velocity[0]
+        cy += self.velocity[1]
+        size = int(min(size, w, h))
+        x0 = int(min(max(0, cx - size / 2), w - size))
+        y0 = int(min(max(0, cy - size / 2), h - size))
+        return x0, y0, x0 + size, y0 + size
+
+    def stats(self):
+        hit_rate = self.roi_hits / self.roi_frames * 100 if self.roi_frames else 0.0
+        roi_avg = self.roi_time / self.roi_frames if self.roi_frames else 0.0
+        full_avg = self.full_time / self.full_frames if self.full_frames else 0.0
+        return (f"roi={self.roi_frames} (hit {hit_rate:.0f}%, avg {roi_avg:.1f}ms) "
+                f"full={self.full_frames} (avg {full_avg:.1f}ms)")
+
+roi_tracker = RoiTracker(enabled=roi_mode)
+
+# --- Adaptive inference ---
+class InferenceScheduler:
+    """Skip hand inference while the hand is still and predict the skipped frames.
+
+    Hand speed is the mean landmark movement per frame (normalized units).
+    At or above fast_speed every frame is inferred; at or below slow_speed
+    only every (max_skip + 1)th frame is, with a linear ramp in between.
+    Skipped frames get the last landmarks extrapolated with their velocity
+    (real-time, so there is no later frame to interpolate towards).
+    """
+
+    def __init__(self, enabled=True, slow_speed=0.003, fast_speed=0.012, max_skip=2):
+        self.enabled = enabled
+        self.slow_speed = slow_speed
+        self.fast_speed = fast_speed
+        self.max_skip = max_skip
+        self.pts = None
+        self.velocity = None
+        self.since_inference = 0
+
+        # Counters
+        self.inferred = 0
+        self.skipped = 0
+
+    def should_infer(self):
+        if not self.enabled or self.pts is None:
+            return True
+        speed = float(np.linalg.norm(self.velocity[:, :2], axis=1).mean())
+        if speed >= self.fast_speed:
+            skip = 0
+        elif speed <= self.slow_speed:
+            skip = self.max_skip
+        else:
+            ramp = (self.fast_speed - speed) / (self.fast_speed - self.slow_speed)
+            skip = int(round(ramp * self.max_skip))
+        return self.since_inference >= skip
+
+    def update(self, pts):
+        """Landmarks from a real inference (None if no hand)"""
+        self.inferred += 1
+        if pts is None:
+            self.pts = None
+            self.velocity = None
+        else:
+            if self.pts is None:
+                self.velocity = np.zeros_like(pts)
+            else:
+                self.velocity = (pts - self.pts) / (self.since_inference + 1)
+            self.pts = pts
+        self.since_inference = 0
+
+    def predict(self):
+        """Extrapolated landmarks for a skipped frame"""
+        self.skipped += 1
+        self.since_inference += 1
+        return self.pts + self.velocity * self.since_inference
+
+    def stats(self):
+        total = self.inferred + self.skipped
+        rate = self.inferred / total * 100 if total else 0.0
+        return f"inferred={self.inferred} skipped={self.skipped} ({rate:.0f}% of frames inferred)"
+
+scheduler = InferenceScheduler(enabled=adaptive_inference)
+
+# --- Frame sources ---
+# Everything below behaves like cv2.VideoCapture (read / isOpened / get / set / release)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+class ImageDirSource:
+    """Frames from the images in a directory, in file name order"""
+
+    def __init__(self, path, fps=30):
+        self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.fps = fps
+        self.index = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self, image=None):
+        while self.index < len(self.files):
+            frame = cv2.imread(self.files[self.index])
+            self.index += 1
+            if frame is not None:
+                return True, frame
+        return False, image
+
+    def get(self, prop):
+        return self.fps if prop == cv2.CAP_PROP_FPS else 0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+class SyntheticSource:
+    """Generated frames (gradient + moving blob), for runs without a camera or files"""
+
+    def __init__(self, width=640, height=480, count=300, fps=30):
+        self.width = width
+        self.height = height
+        self.count = count
+        self.fps = fps
+        self.index = 0
+        ramp = np.linspace(40, 200, width, dtype=np.uint8)
+        self.background = np.repeat(np.repeat(ramp[None, :, None], height, axis=0), 3, axis=2)
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        if self.index >= self.count:
+            return False, image
+        if image is None or image.shape != self.background.shape:
+            image = np.empty_like(self.background)
+        np.copyto(image, self.background)
+        x = int((self.index * 7) % self.width)
+        cv2.circle(image, (x, self.height // 2), self.height // 8, (90, 150, 220), -1)
+        self.index += 1
+        return True, image
+
+    def get(self, prop):
+        return self.fps if prop == cv2.CAP_PROP_FPS else 0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+class PacedSource:
+    """Deliver a file/synthetic source at its frame rate, like a camera would"""
+
+    def __init__(self, source, fps):
+        self.source = source
+        self.interval = 1.0 / fps
+        self.next_time = None
+
+    def read(self, image=None):
+        now = time.perf_counter()
+        if self.next_time is None:
+            self.next_time = now
+        elif self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time += self.interval
+        return self.source.read(image)
+
+    def __getattr__(self, name):
+        return getattr(self.source, name)
+
+def open_frame_source(spec, realtime=True):
+    """Open a camera index ("0"), video file, image directory or "synthetic[:WxH[:N]]".
+
+    Non-camera sources are paced to their frame rate when realtime is set;
+    batch runs read them as fast as possible.
+    """
+    if spec.isdigit():
+        cap = cv2.VideoCapture(int(spec))
+        cap.set(cv2.CAP_PROP_FPS, 30)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, capture_width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, capture_height)
+        # Keep the driver queue short, the grabber thread always takes the newest frame
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    if spec.startswith("synthetic"):
+        parts = spec.split(":")
+        width, height = (int(v) for v in parts[1].split("x")) if len(parts) > 1 else (capture_width, capture_height)
+        count = int(parts[2]) if len(parts) > 2 else 300
+        source = SyntheticSource(width, height, count)
+    elif os.path.isdir(spec):
+        source = ImageDirSource(spec)
+    else:
+        source = cv2.VideoCapture(spec)
+
+    if not realtime:
+        return source
+    return PacedSource(source, source.get(cv2.CAP_PROP_FPS) or 30)
+
+# --- Capture thread ---
+class FrameGrabber:
+    """Read the camera on its own thread and keep only the newest frame.
+
+    If the main loop is slower than the camera, older frames are overwritten
+    (counted as dropped) instead of queueing up in the driver buffer.
+    Frames are read into three reused buffers: the newest frame, the one the
+    main loop is working on (valid until its next read()), and the one being
+    filled.
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.cond = threading.Condition()
+        self.slots = [None, None, None]
+        self.stamps = [0, 0, 0]  # perf_counter_ns right after each frame was read
+        self.latest_slot = None
+        self.reading_slot = None
+        self.frame_id = 0
+        self.last_read_id = 0
+        self.running = False
+        self.thread = None
+
+        # Counters
+        self.captured = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            with self.cond:
+                slot = next(i for i in range(3) if i not in (self.latest_slot, self.reading_slot))
+            ret, frame = self.cap.read(self.slots[slot])
+            stamp = time.perf_counter_ns()
+            with self.cond:
+                if not ret:
+                    self.running = False
+                    self.cond.notify_all()
+                    break
+                if self.frame_id > self.last_read_id:
+                    self.dropped += 1
+                self.slots[slot] = frame
+                self.stamps[slot] = stamp
+                self.latest_slot = slot
+                self.frame_id += 1
+                self.captured += 1
+                self.cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """Wait for a frame newer than the last one read; return (ok, frame, capture_time_ns)"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.frame_id > self.last_read_id or not self.running,
+                               timeout=timeout)
+            if self.frame_id <= self.last_read_id:
+                return False, None, 0
+            self.last_read_id = self.frame_id
+            self.reading_slot = self.latest_slot
+            self.processed += 1
+            return True, self.slots[self.reading_slot], self.stamps[self.reading_slot]
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+    def stats(self):
+        return f"captured={self.captured} dropped={self.dropped} processed={self.processed}"
+
+# --- Recording ---
+class LandmarkRecorder:
+    """Save what the gesture layer sees, for offline replay (replay.py).
+
+    The .npz file holds landmarks (N, max_hands, 21, 3) float32, NaN where
+    there was no hand, and the clock() timestamp of every frame. With
+    save_frames the camera frames also go to a .avi next to it.
+    """
+
+    def __init__(self, path, save_frames=False, max_hands=1, fps=30):
+        self.path = path
+        self.max_hands = max_hands
+        self.fps = fps
+        self.landmarks = []
+        self.timestamps = []
+        self.video_path = os.path.splitext(path)[0] + ".avi" if save_frames else None
+        self.video = None
+
+    def add(self, hands_pts, timestamp, frame=None):
+        frame_pts = np.full((self.max_hands, 21, 3), np.nan, np.float32)
+        for i, pts in enumerate(hands_pts[:self.max_hands]):
+            frame_pts[i] = pts
+        self.landmarks.append(frame_pts)
+        self.timestamps.append(timestamp)
+
+        if self.video_path and frame is not None:
+            if self.video is None:
+                h, w = frame.shape[:2]
+                self.video = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*"MJPG"),
+                                             self.fps, (w, h))
+            self.video.write(frame)
+
+    def close(self):
+        landmarks = np.stack(self.landmarks) if self.landmarks else np.zeros((0, self.max_hands, 21, 3), np.float32)
+        np.savez_compressed(self.path, landmarks=landmarks, timestamps=np.array(self.timestamps))
+        print(f"Recorded {len(self.landmarks)} frames: {self.path}")
+        if self.video is not None:
+            self.video.release()
+            print(f"Recorded frames: {self.video_path}")
+
+def load_recording(path):
+    """Read a LandmarkRecorder file -> (landmarks, timestamps)"""
+    with np.load(path) as data:
+        return data["landmarks"], data["timestamps"]
+
+# --- Batch mode ---
+class ActionLog:
+    """Action sink with the ActionDispatcher methods that only logs (batch runs, replay)"""
+
+    def __init__(self):
+        self.log = []
+        self.frame = 0
+
+    def scroll(self, amount, gesture="scroll", origin_ns=None):
+        self.log.append((self.frame, "scroll", amount))
+        return True
+
+    def press(self, key, gesture=None, origin_ns=None):
+        self.log.append((self.frame, "press", key))
+        return True
+
+    def hotkey(self, *keys, gesture=None, origin_ns=None):
+        self.log.append((self.frame, "hotkey", "+".join(keys)))
+        return True
+
+    def call(self, name, func, origin_ns=None):
+        # Not run: a screenshot would grab the real screen
+        self.log.append((self.frame, "call", name))
+        return True
+
+    def counts(self):
+        counts = {}
+        for _, kind, value in self.log:
+            counts[f"{kind} {value}"] = counts.get(f"{kind} {value}", 0) + 1
+        return counts
+
+def run_batch(source, hands_model, fps=30):
+    """Run detection + gestures on every frame of a source as fast as possible.
+
+    Actions are only logged, and the gesture clock follows the frame index
+    at the source's fps so cooldowns behave as in real time. Adaptive
+    frame skipping is off: every frame is inferred.
+    """
+    global actions, clock
+    saved = actions, clock
+    log = actions = ActionLog()
+    tracker = RoiTracker(enabled=roi_mode and max_hands == 1)
+    reset_gesture_state()
+    frames = hand_frames = 0
+    start = time.perf_counter()
+    try:
+        time_base = time.time()
+        clock = lambda: time_base + frames / fps
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            frame = flip_frame(frame)
+            results = tracker.process(hands_model, tracker.prepare(frame))
+            log.frame = frames
+            if results.multi_hand_landmarks:
+                hand_frames += 1
+            handle_hands([landmarks_to_array(hand_landmarks.landmark)
+                          for hand_landmarks in results.multi_hand_landmarks or []],
+                         handedness_labels(results))
+            if continuous_scroll:
+                scroller.tick()
+            frames += 1
+    finally:
+        actions, clock = saved
+    seconds = time.perf_counter() - start
+    return {
+        "frames": frames,
+        "seconds": seconds,
+        "fps": frames / seconds if seconds else 0.0,
+        "hand_rate": hand_frames / frames if frames else 0.0,
+        "actions": log.counts(),
+        "roi": tracker.stats(),
+    }
+
+# --- Preview ---
+INSTRUCTIONS = [
+    "Thumb+Index: Zoom | All fingers: Reset",
+    "Point up/down: Scroll | 2 fingers: Left/Right", 
+    "3 fingers: Screenshot | Press 'q' to quit"
+]
+
+class StaticOverlay:
+    """White HUD text that never changes, rasterized once per frame size.
+
+    The lines are drawn once on a black image and only the bounding box of
+    the text is kept. Each frame blends that small box in with three cheap
+    whole-array ops instead of calling cv2.putText again:
+    out = 255 - (255 - frame) * (1 - coverage), which is exactly what
+    putText does for white text (anti-aliased edges included).
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.shape = None
+
+    def _build(self, shape):
+        h, w = shape[:2]
+        self.shape = shape
+        layer = np.zeros(shape, np.uint8)
+        y_pos = h - 80
+        for line in self.lines:
+            cv2.putText(layer, line, (10, y_pos), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            y_pos += 25
+        x, y, bw, bh = cv2.boundingRect(layer[:, :, 0])
+        self.rect = (x, y, bw, bh)
+        self.keep = cv2.bitwise_not(layer[y:y + bh, x:x + bw])  # 255 * (1 - coverage)
+
+    def apply(self, frame):
+        if frame.shape != self.shape:
+            self._build(frame.shape)
+        x, y, w, h = self.rect
+        roi = frame[y:y + h, x:x + w]
+        cv2.bitwise_not(roi, dst=roi)
+        cv2.multiply(roi, self.keep, dst=roi, scale=1 / 255)
+        cv2.bitwise_not(roi, dst=roi)
+
+instructions_overlay = StaticOverlay(INSTRUCTIONS)
+
+def render_preview(frame, detected, status_text):
+    """Draw landmarks and the HUD and show the window; return False when 'q' is pressed"""
+    for hand_landmarks, _ in detected:
+        mp_draw.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+
+    # Display status (dynamic)
     if status_text:
         cv2.putText(frame, status_text, (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
 
-    # Display screenshot count
-    cv2.putText(frame, f"Screenshots: {screenshot_count}", (10, 70), 
+    # Display screenshot count (dynamic)
+    with screenshot_lock:
+        shots = f"Screenshots: {screenshot_count} {last_screenshot_file}"
+    cv2.putText(frame, shots, (10, 70), 
                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
 
-    # Display instructions
-    instructions = [
-        "Thumb+Index: Zoom | All fingers: Reset",
-        "Point up/down: Scroll | 2 fingers: Left/Right", 
-        "3 fingers: Screenshot | Press 'q' to quit"
-    ]
-    
-    y_pos = frame.shape[0] - 80
-    for instruction in instructions:
-        cv2.putText(frame, instruction, (10, y_pos), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        y_pos += 25
+    # Display FPS and stage latencies p50/p95 (dynamic)
+    x_pos = frame.shape[1] - 200
+    for i, line in enumerate(stage_timer.hud()):
+        cv2.putText(frame, line, (x_pos, 20 + i * 18), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
+
+    # Display instructions (cached)
+    instructions_overlay.apply(frame)
 
     cv2.imshow("Multi-Gesture Hand Control", frame)
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
+    return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+# --- Quit handling ---
+stop_event = threading.Event()
+
+def install_quit_handlers(headless):
+    """Ctrl+C / SIGTERM stop the loop; in headless mode 'q' + Enter on stdin too"""
+    def on_signal(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    if headless:
+        def watch_stdin():
+            for line in sys.stdin:
+                if line.strip().lower() == "q":
+                    stop_event.set()
+                    break
+
+        threading.Thread(target=watch_stdin, name="StdinQuit", daemon=True).start()
+
+def int_in_range(low, high):
+    """argparse type: an int between low and high"""
+    def parse(text):
+        value = int(text)
+        if not low <= value <= high:
+            raise argparse.ArgumentTypeError(f"{value} is not in {low}-{high}")
+        return value
+    parse.__name__ = "int"   # argparse's "invalid int value" message
+    return parse
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Control the browser with hand gestures")
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file, image directory or synthetic[:WxH[:N]]")
+    parser.add_argument("--batch", action="store_true",
+                        help="process every frame of the source as fast as possible (no window, "
+                             "actions only logged) and report frames/s")
+    parser.add_argument("--max-hands", type=int, default=1,
+                        help="hands to track; 2 enables two-hand gestures (spread both open hands to zoom)")
+    parser.add_argument("--model-complexity", type=int, default=0, choices=[0, 1])
+    parser.add_argument("--min-detection-confidence", type=float, default=0.7)
+    parser.add_argument("--min-tracking-confidence", type=float, default=0.7)
+    parser.add_argument("--actions", default="pyautogui", choices=sorted(ACTION_BACKENDS),
+                        help="input backend: pyautogui, native Linux xtest/uinput, "
+                             "record calls only, or do nothing")
+    parser.add_argument("--step-scroll", action="store_true",
+                        help="scroll in fixed steps instead of the continuous tilt-controlled rate")
+    parser.add_argument("--step-zoom", action="store_true",
+                        help="one zoom step per second from a fixed pinch threshold "
+                             "instead of steps proportional to the pinch change")
+    parser.add_argument("--absolute-thresholds", action="store_true",
+                        help="do not scale the distance thresholds with the hand size")
+    parser.add_argument("--screenshot-format", default=screenshot_format, choices=["png", "jpg", "npy"],
+                        help="file format of the screenshots (npy: raw pixels, no encoding)")
+    parser.add_argument("--png-compression", type=int_in_range(0, 9), default=png_compression,
+                        metavar="0-9", help="PNG compress level, higher = smaller file but slower")
+    parser.add_argument("--jpeg-quality", type=int_in_range(1, 95), default=jpeg_quality,
+                        metavar="1-95", help="JPEG quality, higher = larger file")
+    parser.add_argument("--classifier", metavar="PATH",
+                        help="pick gestures with a model from train_classifier.py instead of the rules")
+    parser.add_argument("--no-smoothing", action="store_true",
+                        help="classify the raw landmarks (no One-Euro filter)")
+    parser.add_argument("--headless", action="store_true",
+                        help="no preview window (quit with Ctrl+C or 'q' + Enter)")
+    parser.add_argument("--preview-every", type=int, default=1, metavar="N",
+                        help="only render the preview every Nth frame")
+    parser.add_argument("--stats-file", metavar="PATH",
+                        help="save stage timing histograms on exit (.json or .csv)")
+    parser.add_argument("--latency-file", metavar="PATH",
+                        help="save glass-to-action latency per gesture on exit (.json or .csv)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record the landmarks of every frame to PATH (.npz) for replay.py")
+    parser.add_argument("--record-frames", action="store_true",
+                        help="with --record, also save the camera frames (.avi next to PATH)")
+    return parser.parse_args(argv)
+
+# --- Main Program ---
+def main(argv=None):
+    global continuous_scroll, continuous_zoom, smoothing, normalize_thresholds, max_hands, classifier
+    global screenshot_writer
+    args = parse_args(argv)
+    if args.classifier:
+        classifier = GestureClassifier(args.classifier)
+    max_hands = args.max_hands
+    # Both follow a single hand
+    roi_tracker.enabled = roi_mode and max_hands == 1
+    scheduler.enabled = adaptive_inference and max_hands == 1
+    normalize_thresholds = not args.absolute_thresholds
+    continuous_scroll = not args.step_scroll
+    continuous_zoom = not args.step_zoom
+    smoothing = not args.no_smoothing
+    cap = open_frame_source(args.source, realtime=not args.batch)
+
+    if not cap.isOpened():
+        print("❌ ไม่สามารถเปิดกล้องได้")
+        exit()
+
+    hands = create_hands(args.model_complexity, args.min_detection_confidence,
+                         args.min_tracking_confidence, max_hands)
+
+    if args.batch:
+        stats = run_batch(cap, hands, cap.get(cv2.CAP_PROP_FPS) or 30)
+        print(f"{stats['frames']} frames in {stats['seconds']:.2f}s: {stats['fps']:.1f} frames/s, "
+              f"hand in {stats['hand_rate'] * 100:.0f}% of frames")
+        print(f"Inference: {stats['roi']}")
+        for action, count in sorted(stats["actions"].items()):
+            print(f"  {action}: {count}")
+        cap.release()
+        hands.close()
+        return
+
+    try:
+        actions.backend = create_backend(args.actions)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        exit()
+    screenshot_writer = ScreenshotWriter(args.screenshot_format, args.png_compression, args.jpeg_quality,
+                                         on_done=on_screenshot_saved)
+
+    install_quit_handlers(args.headless)
+
+    if args.headless:
+        print("✅ เปิดกล้องสำเร็จ (headless) — พิมพ์ 'q' แล้วกด Enter หรือ Ctrl+C เพื่อออก")
+    else:
+        print("✅ เปิดกล้องสำเร็จ — กด 'q' เพื่อออก")
+    print("Gestures:")
+    print("- Thumb + Index: Zoom In/Out")
+    print("- All fingers up: Reset Zoom")
+    print("- Index finger pointing: Vertical Scroll")
+    print("- Index + Middle (horizontal): Left/Right")
+    print("- 3 fingers up (index+middle+ring): Screenshot")
+    if max_hands > 1:
+        print("- Both hands open, move apart/together: Zoom In/Out")
+    if classifier:
+        print(f"Gestures picked by {args.classifier}: {', '.join(classifier.classes)}")
+
+    grabber = FrameGrabber(cap).start()
+    actions.start()
+    if continuous_scroll:
+        scroller.start()
+    recorder = LandmarkRecorder(args.record, args.record_frames, max_hands) if args.record else None
+
+    frame_index = 0
+    status_text = ""
+
+    while not stop_event.is_set():
+        t = stage_timer.now()
+        ret, frame, frame_time = grabber.read()
+        if not ret:
+            if grabber.running:
+                continue
+            break
+        t = stage_timer.record("capture", t)
+
+        frame_index += 1
+        render = not args.headless and frame_index % args.preview_every == 0
+
+        camera_frame = frame
+        # Headless: nobody sees the frame, so mirror the landmarks instead of the pixels
+        if not args.headless:
+            frame = flip_frame(frame)
+
+        if scheduler.should_infer():
+            rgb = roi_tracker.prepare(frame)
+            t = stage_timer.record("preprocess", t)
+            results = roi_tracker.process(hands, rgb)
+            t = stage_timer.record("inference", t)
+            # One protobuf -> array conversion per hand
+            detected = [(hand_landmarks, landmarks_to_array(hand_landmarks.landmark))
+                        for hand_landmarks in results.multi_hand_landmarks or []]
+            labels = handedness_labels(results)
+            if args.headless:
+                for _, pts in detected:
+                    pts[:, 0] = 1 - pts[:, 0]
+            scheduler.update(detected[0][1] if detected else None)
+        else:
+            t = stage_timer.record("preprocess", t)
+            pts = scheduler.predict()
+            detected = [(array_to_landmarks(pts) if render else None, pts)]
+            labels = None
+
+        if recorder:
+            recorder.add([pts for _, pts in detected], clock(), camera_frame)
+
+        for result in handle_hands([pts for _, pts in detected], labels, frame_time):
+            status_text = result
+        t = stage_timer.record("gestures", t)
+
+        if render:
+            if not render_preview(frame, detected, status_text):
+                break
+            status_text = ""
+            stage_timer.record("render", t)
+        stage_timer.frame_done()
+
+    grabber.stop()
+    scroller.stop()
+    actions.stop()
+    if recorder:
+        recorder.close()
+    screenshot_writer.close()
+    print(f"Frames: {grabber.stats()}")
+    print(f"Actions: {actions.stats()}")
+    if isinstance(actions.backend, RecordingBackend):
+        print(f"Recorded actions: {actions.backend.summary() or '-'}")
+    print(f"Inference: {roi_tracker.stats()}")
+    print(f"Scheduler: {scheduler.stats()}")
+    print(f"Stages: {stage_timer.summary()}")
+    print(f"Glass-to-action: {action_latency.summary()}")
+    if args.stats_file:
+        stage_timer.dump(args.stats_file)
+    if args.latency_file:
+        action_latency.dump(args.latency_file)
+    cap.release()
+    if not args.headless:
+        cv2.destroyAllWindows()
+    hands.close()
 
-cap.release()
-cv2.destroyAllWindows()
-hands.close()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
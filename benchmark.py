@@ -0,0 +1,389 @@
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import all as app
+import replay
+import train_classifier
+
+
+def timed(func, repeat):
+    """Average run time of func() in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def grab_frame(width, height, camera):
+    """A real camera frame at this resolution, or noise if no camera is used"""
+    if camera is not None:
+        cap = cv2.VideoCapture(camera)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        for _ in range(5):  # let exposure settle
+            ret, frame = cap.read()
+        cap.release()
+        if ret:
+            return frame
+        print(f"Camera read failed at {width}x{height}, using noise")
+    return np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+# --- Benchmarks ---
+def bench_resolution(args):
+    """flip / cvtColor / downscale / ROI crop / hands.process time per capture resolution"""
+    resolutions = [tuple(int(v) for v in r.split("x")) for r in args.resolutions]
+    print(f"inference width: {args.inference_width}, {args.repeat} runs each (ms)")
+    print("roi: a hand-sized crop (60% of the frame height) as RoiTracker cuts it from the full frame")
+    print(f"{'capture':>10} {'flip':>7} {'cvtColor':>9} {'down+cvt':>9} {'process full':>13} {'process down':>13} "
+          f"{'roi prep':>9} {'process roi':>12} {'roi input':>10}")
+    for width, height in resolutions:
+        frame = grab_frame(width, height, args.camera)
+        flipped = cv2.flip(frame, 1)
+        rgb = cv2.cvtColor(flipped, cv2.COLOR_BGR2RGB)
+        small = app.to_inference_image(flipped, args.inference_width)
+        tracker = app.RoiTracker()
+        tracker.box = (width / 2, height / 2, height * 0.6)
+        roi = tracker.prepare(flipped).copy()
+
+        flip_ms = timed(lambda: cv2.flip(frame, 1), args.repeat)
+        cvt_ms = timed(lambda: cv2.cvtColor(flipped, cv2.COLOR_BGR2RGB), args.repeat)
+        down_ms = timed(lambda: app.to_inference_image(flipped, args.inference_width), args.repeat)
+        roi_prep_ms = timed(lambda: tracker.prepare(flipped), args.repeat)
+        hands = app.create_hands()
+        full_ms = timed(lambda: hands.process(rgb), args.repeat)
+        small_ms = timed(lambda: hands.process(small), args.repeat)
+        roi_ms = timed(lambda: hands.process(roi), args.repeat)
+        hands.close()
+        print(f"{width:>5}x{height:<4} {flip_ms:7.2f} {cvt_ms:9.2f} {down_ms:9.2f} {full_ms:13.2f} {small_ms:13.2f} "
+              f"{roi_prep_ms:9.2f} {roi_ms:12.2f} {roi.shape[1]:>5}x{roi.shape[0]:<4}")
+
+
+def naive_preprocess(frame, width):
+    """The old preprocessing path: every step returns a new array"""
+    flipped = cv2.flip(frame, 1)
+    height = round(flipped.shape[0] * width / flipped.shape[1])
+    small = cv2.resize(flipped, (width, height), interpolation=cv2.INTER_LINEAR)
+    return flipped, cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+
+
+def pooled_preprocess(frame, width):
+    """all.py preprocessing: writes into reused buffers"""
+    flipped = app.flip_frame(frame)
+    return flipped, app.to_inference_image(flipped, width)
+
+
+def bench_alloc(args):
+    """Bytes allocated and new output buffers per frame, naive vs pooled preprocessing"""
+    width, height = (int(v) for v in args.resolution.split("x"))
+    frame = grab_frame(width, height, args.camera)
+    print(f"{width}x{height} -> inference width {args.inference_width}, {args.repeat} frames")
+    print(f"{'path':>7} {'bytes/frame':>12} {'new buffers/frame':>18} {'ms/frame':>9}")
+    for name, func in (("naive", naive_preprocess), ("pooled", pooled_preprocess)):
+        # Warm up (fills the pool). The previous frame's outputs stay alive during
+        # the next call, like in the real loop, so a fresh array cannot reuse
+        # their memory and shows up as a new buffer.
+        previous = func(frame, args.inference_width)
+        new_buffers = 0
+        peak_bytes = 0
+        tracemalloc.start()
+        for _ in range(args.repeat):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            outputs = func(frame, args.inference_width)
+            _, peak = tracemalloc.get_traced_memory()
+            peak_bytes += peak - before
+            reused = {out.ctypes.data for out in previous}
+            new_buffers += sum(out.ctypes.data not in reused for out in outputs)
+            previous = outputs
+        tracemalloc.stop()
+        ms = timed(lambda: func(frame, args.inference_width), args.repeat)
+        print(f"{name:>7} {peak_bytes / args.repeat:12.0f} {new_buffers / args.repeat:18.2f} {ms:9.2f}")
+
+
+def bench_pipeline(args):
+    """Full detection + gesture pipeline over a fixed source, per model setting"""
+    print(f"source: {args.source}")
+    print(f"{'complexity':>10} {'det conf':>9} {'track conf':>11} {'frames/s':>9} {'ms/frame':>9} "
+          f"{'hand %':>7}  actions")
+    for complexity in args.complexity:
+        for confidence in args.confidence:
+            source = app.open_frame_source(args.source, realtime=False)
+            hands = app.create_hands(complexity, confidence, confidence)
+            stats = app.run_batch(source, hands, source.get(cv2.CAP_PROP_FPS) or 30)
+            hands.close()
+            source.release()
+            ms = stats["seconds"] / stats["frames"] * 1000 if stats["frames"] else 0.0
+            actions = ", ".join(f"{name} x{count}" for name, count in sorted(stats["actions"].items()))
+            print(f"{complexity:>10} {confidence:>9.2f} {confidence:>11.2f} {stats['fps']:>9.1f} {ms:>9.2f} "
+                  f"{stats['hand_rate'] * 100:>7.1f}  {actions or '-'}")
+
+
+def bench_backends(args):
+    """Per-call latency of each action backend (scroll +-1 and a shift press)"""
+    print(f"{args.repeat} calls each (us per call: p50 / p95 / max)")
+    for name in args.backends:
+        try:
+            backend = app.create_backend(name)
+        except RuntimeError as e:
+            print(f"{name:>10}: skipped ({e})")
+            continue
+        for label, call in (("scroll", lambda i: backend.scroll(1 if i % 2 else -1)),
+                            ("press", lambda i: backend.press("shift"))):
+            samples = np.empty(args.repeat)
+            for i in range(args.repeat):
+                start = time.perf_counter_ns()
+                call(i)
+                samples[i] = time.perf_counter_ns() - start
+            p50, p95 = np.percentile(samples, (50, 95)) / 1000
+            print(f"{name:>10} {label:>7}: {p50:9.1f} / {p95:9.1f} / {samples.max() / 1000:9.1f}")
+
+
+def replay_actions(landmarks, timestamps, smoothing):
+    """Replay a recording into an ActionLog; return (action counts, seconds)"""
+    app.smoothing = smoothing
+    sink = app.actions = app.ActionLog()
+    start = time.perf_counter()
+    replay.replay(landmarks, timestamps, sink)
+    elapsed = time.perf_counter() - start
+    counts = {}
+    for _, kind, value in sink.log:
+        key = f"{kind} {'+' if value > 0 else '-'}" if kind == "scroll" else f"{kind} {value}"
+        counts[key] = counts.get(key, 0) + 1
+    return counts, elapsed
+
+
+def bench_smoothing(args):
+    """False actions per minute and cost with and without landmark smoothing (replay)"""
+    landmarks, timestamps = app.load_recording(args.recording)
+    minutes = max(timestamps[-1] - timestamps[0], 1e-9) / 60 if len(timestamps) else 0.0
+    # Discrete scroll steps, so every action counts once
+    app.continuous_scroll = False
+    saved_actions, saved_clock = app.actions, app.clock
+    try:
+        reference, _ = replay_actions(landmarks, timestamps, smoothing=False)
+        print(f"{args.recording}: {len(landmarks)} frames, {minutes * 60:.1f}s")
+        print(f"reference (recording as is): {sum(reference.values())} actions")
+        print(f"{'jitter':>7} {'smoothing':>10} {'actions':>8} {'false':>6} {'false/min':>10} {'us/frame':>9}")
+        rng = np.random.default_rng(0)
+        for jitter in args.jitter:
+            noisy = landmarks + rng.normal(0, jitter, landmarks.shape).astype(np.float32) if jitter else landmarks
+            for smoothing in (False, True):
+                counts, elapsed = replay_actions(noisy, timestamps, smoothing)
+                # Actions beyond the reference ones, per action type
+                false = sum(max(0, n - reference.get(key, 0)) for key, n in counts.items())
+                rate = false / minutes if minutes else 0.0
+                print(f"{jitter:>7.4f} {'on' if smoothing else 'off':>10} {sum(counts.values()):>8} "
+                      f"{false:>6} {rate:>10.1f} {elapsed / len(landmarks) * 1e6:>9.1f}")
+    finally:
+        app.actions, app.clock = saved_actions, saved_clock
+
+    pts = landmarks[~np.isnan(landmarks[:, 0, 0, 0]), 0][0]
+    for name, params in app.SMOOTHING_PROFILES.items():
+        if params:
+            filt = app.OneEuroFilter(**params)
+            step = iter(range(1, 1_000_000_000))
+            us = timed(lambda: filt(pts, next(step) / 30), args.repeat) * 1000
+            print(f"OneEuroFilter '{name}': {us:.1f} us per hand per frame")
+
+
+def classify_frames(landmarks, timestamps):
+    """Name of the gesture rule chosen for each frame's first hand (None if no rule/hand)"""
+    app.reset_gesture_state()
+    hand = app.HandState("benchmark")
+    names = []
+    for pts, t in zip(landmarks[:, 0], timestamps):
+        app.clock = lambda: t
+        if np.isnan(pts[0, 0]):
+            names.append(None)
+            continue
+        rule, _ = app.classify(app.hand_features(pts, hand))
+        names.append(rule.name if rule else None)
+    return names
+
+
+def bench_distance(args):
+    """Gesture accuracy when the hand is further/closer (recording scaled about the wrist)"""
+    landmarks, timestamps = app.load_recording(args.recording)
+    hand = ~np.isnan(landmarks[:, 0, 0, 0])
+    app.continuous_scroll = app.continuous_zoom = False
+    saved_actions, saved_clock = app.actions, app.clock
+    print(f"{args.recording}: {len(landmarks)} frames, {hand.sum()} with a hand")
+    print("accuracy = frames classified as at scale 1, false = actions beyond the scale 1 ones")
+    print(f"{'thresholds':>10} {'scale':>6} {'accuracy':>9} {'actions':>8} {'false':>6}")
+    try:
+        for normalize in (False, True):
+            app.normalize_thresholds = normalize
+            reference = classify_frames(landmarks, timestamps)
+            reference_actions, _ = replay_actions(landmarks, timestamps, smoothing=True)
+            for scale in args.scales:
+                wrist = landmarks[:, :, :1]
+                scaled = wrist + (landmarks - wrist) * np.float32(scale)
+                names = classify_frames(scaled, timestamps)
+                same = sum(a == b for a, b, h in zip(names, reference, hand) if h)
+                counts, _ = replay_actions(scaled, timestamps, smoothing=True)
+                false = sum(max(0, n - reference_actions.get(key, 0)) for key, n in counts.items())
+                print(f"{'hand' if normalize else 'absolute':>10} {scale:>6.2f} "
+                      f"{same / max(hand.sum(), 1) * 100:>8.1f}% {sum(counts.values()):>8} {false:>6}")
+    finally:
+        app.actions, app.clock = saved_actions, saved_clock
+        app.normalize_thresholds = True
+
+
+def bench_hands(args):
+    """Inference and gesture-layer cost as the number of tracked hands grows"""
+    print(f"source: {args.source}")
+    print(f"{'max hands':>9} {'frames/s':>9} {'ms/frame':>9} {'hands/frame':>12} {'ms/hand':>8}")
+    sample = None
+    for max_hands in args.max_hands:
+        source = app.open_frame_source(args.source, realtime=False)
+        hands = app.create_hands(max_num_hands=max_hands)
+        frames = found = 0
+        elapsed = 0.0
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            rgb = app.to_inference_image(app.flip_frame(frame))
+            start = time.perf_counter()
+            results = hands.process(rgb)
+            elapsed += time.perf_counter() - start
+            frames += 1
+            found += len(results.multi_hand_landmarks or [])
+            if sample is None and results.multi_hand_landmarks:
+                sample = app.landmarks_to_array(results.multi_hand_landmarks[0].landmark)
+        hands.close()
+        source.release()
+        ms = elapsed / frames * 1000 if frames else 0.0
+        per_hand = elapsed / found * 1000 if found else 0.0
+        print(f"{max_hands:>9} {frames / elapsed if elapsed else 0.0:>9.1f} {ms:>9.2f} "
+              f"{found / max(frames, 1):>12.2f} {per_hand:>8.2f}")
+
+    # Gesture layer (matching, smoothing, features, rules) for 1..N copies of one detected hand
+    if sample is None:
+        print("no hand detected in the source, gesture layer not measured")
+        return
+    saved_actions, saved_clock = app.actions, app.clock
+    app.actions = app.ActionLog()
+    try:
+        print(f"{'hands':>9} {'gesture us/frame':>17} {'us/hand':>8}")
+        for count in range(1, max(args.max_hands) + 1):
+            app.reset_gesture_state()
+            hands_pts = [sample + np.float32([0.3 * i, 0, 0]) for i in range(count)]
+            step = iter(range(1, 1_000_000_000))
+            app.clock = lambda: next(step) / 30
+            us = timed(lambda: app.handle_hands(hands_pts), args.repeat) * 1000
+            print(f"{count:>9} {us:>17.1f} {us / count:>8.1f}")
+    finally:
+        app.actions, app.clock = saved_actions, saved_clock
+
+
+def bench_classifier(args):
+    """Rule cascade vs learned classifier: accuracy on labelled sessions and us/frame"""
+    model = app.GestureClassifier(args.model, args.min_prob)
+    samples, labels, rule_names = train_classifier.load_sessions(args.sessions, model.profile)
+    predicted = []
+    for start in range(0, len(samples), 256):
+        predicted += model.predict(list(samples[start:start + 256]))
+    predicted = [name or "none" for name in predicted]
+
+    print(f"{'label':>18} {'frames':>7} {'rules':>7} {'model':>7}")
+    for label in sorted(set(labels)):
+        idx = [i for i, name in enumerate(labels) if name == label]
+        rules_acc = np.mean([rule_names[i] == label for i in idx]) * 100
+        model_acc = np.mean([predicted[i] == label for i in idx]) * 100
+        print(f"{label:>18} {len(idx):>7} {rules_acc:>6.1f}% {model_acc:>6.1f}%")
+    rules_acc = np.mean([a == b for a, b in zip(rule_names, labels)]) * 100
+    model_acc = np.mean([a == b for a, b in zip(predicted, labels)]) * 100
+    print(f"{'all':>18} {len(labels):>7} {rules_acc:>6.1f}% {model_acc:>6.1f}%")
+
+    # Per-frame cost of the live gesture layer (handle_hands: smoothing, features,
+    # decision, state machine) with each decider, plus the forward pass alone
+    saved_actions, saved_clock, saved_classifier = app.actions, app.clock, app.classifier
+    app.actions = app.ActionLog()
+    pts = samples[0]
+    try:
+        print(f"{'hands':>5} {'rules us/frame':>15} {'model us/frame':>15} {'forward pass us':>16}")
+        for count in (1, 2, 4):
+            hands_pts = [pts + np.float32([0.3 * i, 0, 0]) for i in range(count)]
+            costs = []
+            for decider in (None, model):
+                app.classifier = decider
+                app.reset_gesture_state()
+                step = iter(range(1, 1_000_000_000))
+                app.clock = lambda: next(step) / 30
+                costs.append(timed(lambda: app.handle_hands(hands_pts), args.repeat) * 1000)
+            forward_us = timed(lambda: model.predict(hands_pts), args.repeat) * 1000
+            print(f"{count:>5} {costs[0]:>15.1f} {costs[1]:>15.1f} {forward_us:>16.1f}")
+    finally:
+        app.actions, app.clock, app.classifier = saved_actions, saved_clock, saved_classifier
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmarks for all.py")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("resolution", help=bench_resolution.__doc__)
+    p.add_argument("--resolutions", nargs="+", default=["320x240", "640x480", "1280x720", "1920x1080"])
+    p.add_argument("--inference-width", type=int, default=app.inference_width)
+    p.add_argument("--camera", type=int, default=None, help="use real frames from this camera index")
+    p.add_argument("--repeat", type=int, default=50)
+    p.set_defaults(func=bench_resolution)
+
+    p = sub.add_parser("alloc", help=bench_alloc.__doc__)
+    p.add_argument("--resolution", default="1280x720")
+    p.add_argument("--inference-width", type=int, default=app.inference_width)
+    p.add_argument("--camera", type=int, default=None, help="use a real frame from this camera index")
+    p.add_argument("--repeat", type=int, default=200)
+    p.set_defaults(func=bench_alloc)
+
+    p = sub.add_parser("pipeline", help=bench_pipeline.__doc__)
+    p.add_argument("--source", default="synthetic:640x480:300",
+                   help="video file, image directory or synthetic[:WxH[:N]] (see all.py --source)")
+    p.add_argument("--complexity", type=int, nargs="+", default=[0, 1])
+    p.add_argument("--confidence", type=float, nargs="+", default=[0.5, 0.7])
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("backends", help=bench_backends.__doc__)
+    p.add_argument("--backends", nargs="+", default=list(app.ACTION_BACKENDS))
+    p.add_argument("--repeat", type=int, default=200)
+    p.set_defaults(func=bench_backends)
+
+    p = sub.add_parser("smoothing", help=bench_smoothing.__doc__)
+    p.add_argument("recording", help=".npz file written by all.py --record")
+    p.add_argument("--jitter", type=float, nargs="+", default=[0.0, 0.002, 0.005],
+                   help="std of the Gaussian noise added to the landmarks (normalized units)")
+    p.add_argument("--repeat", type=int, default=2000)
+    p.set_defaults(func=bench_smoothing)
+
+    p = sub.add_parser("distance", help=bench_distance.__doc__)
+    p.add_argument("recording", help=".npz file written by all.py --record")
+    p.add_argument("--scales", type=float, nargs="+", default=[0.5, 0.75, 1.0, 1.5],
+                   help="hand size relative to the recording (0.5 = twice as far from the camera)")
+    p.set_defaults(func=bench_distance)
+
+    p = sub.add_parser("hands", help=bench_hands.__doc__)
+    p.add_argument("--source", default="synthetic:640x480:300",
+                   help="video file or image directory with several hands (see all.py --source)")
+    p.add_argument("--max-hands", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--repeat", type=int, default=500)
+    p.set_defaults(func=bench_hands)
+
+    p = sub.add_parser("classifier", help=bench_classifier.__doc__)
+    p.add_argument("model", help="model file from train_classifier.py")
+    p.add_argument("sessions", nargs="+",
+                   help="gesture=path.npz labelled recordings (see train_classifier.py), "
+                        "ideally not the ones the model was trained on")
+    p.add_argument("--min-prob", type=float, default=0.6)
+    p.add_argument("--repeat", type=int, default=2000)
+    p.set_defaults(func=bench_classifier)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+import all as app
+
+
+def replay(landmarks, timestamps, sink):
+    """Feed a recording through the all.py gesture layer; return the status texts"""
+    app.reset_gesture_state()
+    statuses = []
+    current = [0.0]
+    app.clock = lambda: current[0]
+    for i in range(len(landmarks)):
+        sink.frame = i
+        current[0] = timestamps[i]
+        hands = [pts for pts in landmarks[i] if not np.isnan(pts[0, 0])]
+        statuses.extend((i, result) for result in app.handle_hands(hands))
+        if app.continuous_scroll:
+            app.scroller.tick()
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a landmark recording (all.py --record) without a camera")
+    parser.add_argument("recording", help=".npz file written by all.py --record")
+    parser.add_argument("--repeat", type=int, default=1, help="replay N times (throughput benchmark)")
+    parser.add_argument("--actions-out", metavar="PATH", help="save the action log as JSON")
+    args = parser.parse_args()
+
+    landmarks, timestamps = app.load_recording(args.recording)
+    sink = app.ActionLog()
+    app.actions = sink
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        sink.log.clear()
+        replay(landmarks, timestamps, sink)
+    elapsed = time.perf_counter() - start
+
+    frames = len(landmarks) * args.repeat
+    print(f"{len(landmarks)} frames x {args.repeat}: {elapsed:.3f}s, "
+          f"{frames / elapsed:.0f} frames/s, {elapsed / frames * 1e6:.1f} us/frame")
+
+    for action, count in sorted(sink.counts().items()):
+        print(f"  {action}: {count}")
+
+    if args.actions_out:
+        with open(args.actions_out, "w") as fh:
+            json.dump([{"frame": frame, "action": kind, "value": value}
+                       for frame, kind, value in sink.log], fh, indent=1)
+        print(f"Action log saved: {args.actions_out}")
+
+
+if __name__ == "__main__":
+    main()
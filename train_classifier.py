@@ -0,0 +1,134 @@
+import argparse
+
+import numpy as np
+
+import all as app
+
+
+def session_samples(landmarks, timestamps, profile):
+    """Every hand frame of a recording as the classifier sees it (smoothed with
+    profile), with the rule cascade's pick for it ("none" if no rule)"""
+    app.reset_gesture_state()
+    hands = [app.HandState(f"hand-{i}") for i in range(landmarks.shape[1])]
+    current = [0.0]
+    saved_clock = app.clock
+    app.clock = lambda: current[0]
+    samples, rule_names = [], []
+    try:
+        for frame, timestamp in zip(landmarks, timestamps):
+            current[0] = timestamp
+            for pts, hand in zip(frame, hands):
+                if np.isnan(pts[0, 0]):
+                    continue
+                feats = app.hand_features(pts, hand)
+                rule, _ = app.classify(feats)
+                samples.append(feats[profile].pts if profile in feats else pts)
+                rule_names.append(rule.name if rule else "none")
+    finally:
+        app.clock = saved_clock
+    return np.array(samples, np.float32).reshape(-1, 21, 3), rule_names
+
+
+def load_sessions(specs, profile):
+    """specs: "gesture=path.npz" (every frame is that gesture, "none" for idle
+    hands) or "path.npz" (labelled by the rule cascade).
+    Returns (samples (n, 21, 3), labels, rule cascade picks)."""
+    samples, labels, rule_names = [], [], []
+    for spec in specs:
+        name, _, path = spec.rpartition("=")
+        pts, rules = session_samples(*app.load_recording(path), profile)
+        samples.append(pts)
+        labels += [name] * len(rules) if name else rules
+        rule_names += rules
+        print(f"{path}: {len(rules)} hand frames, label {name or 'from rules'}")
+    return np.concatenate(samples), labels, rule_names
+
+
+def train_mlp(x, y, classes, hidden=32, epochs=200, lr=0.01, batch=128, seed=0):
+    """Softmax MLP with one ReLU layer, trained with Adam on cross-entropy"""
+    rng = np.random.default_rng(seed)
+    params = {
+        "w1": rng.normal(0, np.sqrt(2 / x.shape[1]), (x.shape[1], hidden)),
+        "b1": np.zeros(hidden),
+        "w2": rng.normal(0, np.sqrt(2 / hidden), (hidden, len(classes))),
+        "b2": np.zeros(len(classes)),
+    }
+    moments = {k: (np.zeros_like(v), np.zeros_like(v)) for k, v in params.items()}
+    target = np.eye(len(classes))[y]
+    step = 0
+    for epoch in range(epochs):
+        order = rng.permutation(len(x))
+        for start in range(0, len(x), batch):
+            idx = order[start:start + batch]
+            xb, tb = x[idx], target[idx]
+            hidden_in = xb @ params["w1"] + params["b1"]
+            h = np.maximum(hidden_in, 0)
+            logits = h @ params["w2"] + params["b2"]
+            prob = np.exp(logits - logits.max(axis=1, keepdims=True))
+            prob /= prob.sum(axis=1, keepdims=True)
+
+            d_logits = (prob - tb) / len(idx)
+            d_h = d_logits @ params["w2"].T * (hidden_in > 0)
+            grads = {"w2": h.T @ d_logits, "b2": d_logits.sum(0),
+                     "w1": xb.T @ d_h, "b1": d_h.sum(0)}
+
+            step += 1
+            for k, g in grads.items():
+                m, v = moments[k]
+                m[:] = 0.9 * m + 0.1 * g
+                v[:] = 0.999 * v + 0.001 * g * g
+                params[k] -= lr * (m / (1 - 0.9 ** step)) / (np.sqrt(v / (1 - 0.999 ** step)) + 1e-8)
+    return params
+
+
+def predict(params, x):
+    h = np.maximum(x @ params["w1"] + params["b1"], 0)
+    return (h @ params["w2"] + params["b2"]).argmax(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the landmark gesture classifier (all.py --classifier)")
+    parser.add_argument("output", help="model file to write (.npz)")
+    parser.add_argument("sessions", nargs="+",
+                        help="recordings from all.py --record: gesture=path.npz for a session of one "
+                             "gesture ('none' for no gesture), or path.npz to label it with the rules")
+    parser.add_argument("--profile", default="steady", choices=sorted(app.SMOOTHING_PROFILES),
+                        help="smoothing profile of the landmarks the model sees")
+    parser.add_argument("--hidden", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--lr", type=float, default=0.01)
+    parser.add_argument("--test-split", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    samples, labels, rule_names = load_sessions(args.sessions, args.profile)
+    classes = sorted(set(labels) | {"none"})
+    unknown = set(classes) - set(app.RULES_BY_NAME) - {"none"}
+    if unknown:
+        parser.error(f"unknown gestures {sorted(unknown)}, expected {sorted(app.RULES_BY_NAME)} or none")
+    x = app.normalize_hands(samples).astype(np.float64)
+    y = np.array([classes.index(label) for label in labels])
+
+    order = np.random.default_rng(args.seed).permutation(len(x))
+    n_test = int(len(x) * args.test_split)
+    test, train = order[:n_test], order[n_test:]
+    mean = x[train].mean(axis=0)
+    std = x[train].std(axis=0) + 1e-6
+
+    params = train_mlp((x[train] - mean) / std, y[train], classes, args.hidden, args.epochs, args.lr,
+                       seed=args.seed)
+    train_acc = (predict(params, (x[train] - mean) / std) == y[train]).mean()
+    print(f"{len(x)} samples, {len(classes)} classes: {', '.join(classes)}")
+    print(f"train accuracy: {train_acc * 100:.1f}%")
+    if n_test:
+        test_acc = (predict(params, (x[test] - mean) / std) == y[test]).mean()
+        rules_acc = np.mean([rule_names[i] == labels[i] for i in test])
+        print(f"test accuracy: {test_acc * 100:.1f}% (rule cascade on the same frames: {rules_acc * 100:.1f}%)")
+
+    np.savez(args.output, classes=np.array(classes), profile=args.profile, mean=mean, std=std,
+             **{k: v.astype(np.float32) for k, v in params.items()})
+    print(f"Model saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()